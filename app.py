@@ -1,28 +1,140 @@
-import requests
+import hashlib
+import json
+import logging
 import os
+import random
+import time
 from dotenv import load_dotenv
 
-from collections import defaultdict
-from flask import Flask, render_template, request, jsonify
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_EXCEPTION
+from flask import Flask, Response, g, render_template, request, jsonify
 from datetime import datetime, timezone
 
+import numpy as np
+
+import weather_client
+from ratelimit import BATCH, INTERACTIVE, RateLimited, limiter
+from resilience import CircuitOpen
+from compression import COMPRESS_MIN_BYTES, COMPRESSIBLE_TYPES, StreamCompressor, choose_encoding, compress, weak_etag
+from forecast_engine import forecast_columns, daily_aggregates, at_hours, local_day, day_strings
+from weather_cache import current_cache, forecast_cache, location_key
+from metrics import Gauge, Histogram, render
+
 app = Flask(__name__)
+logger = logging.getLogger(__name__)
 
 load_dotenv()
 
-API_KEY = os.getenv("OPENWEATHER_API_KEY")
-BASE_URL = "https://api.openweathermap.org/data/2.5/weather"
-REVERSE_URL = "http://api.openweathermap.org/geo/1.0/reverse"
-ZIP_URL = "https://api.openweathermap.org/geo/1.0/zip"
-FORECAST_URL = "http://api.openweathermap.org/data/2.5/forecast"
+# Seconds to wait for both upstream calls before giving up on the request
+UPSTREAM_DEADLINE = float(os.getenv("UPSTREAM_DEADLINE", "5"))
+
+# Shared pool so current weather and forecast are fetched in parallel
+upstream_pool = ThreadPoolExecutor(max_workers=int(os.getenv("UPSTREAM_WORKERS", "16")))
+
+# Fraction of forecasts whose entry timestamps are written to the debug log
+FORECAST_LOG_SAMPLE_RATE = float(os.getenv("FORECAST_LOG_SAMPLE_RATE", "0.01"))
+
+REQUEST_SECONDS = Histogram('weather_http_request_duration_seconds',
+                            'End-to-end latency of requests to this app', ['route', 'method', 'status'])
+PROCESS_FORECAST_SECONDS = Histogram('weather_process_forecast_duration_seconds',
+                                     'Time spent in process_forecast_data',
+                                     buckets=(0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+def cache_lookups():
+    lookups = {}
+    for name, cache in (('current', current_cache), ('forecast', forecast_cache)):
+        lookups[(name, 'hit')] = cache.hits
+        lookups[(name, 'miss')] = cache.misses
+        lookups[(name, 'stale')] = cache.stale_hits
+    return lookups
+
+def cache_hit_ratio():
+    return {
+        (name,): cache.hits / ((cache.hits + cache.misses) or 1)
+        for name, cache in (('current', current_cache), ('forecast', forecast_cache))
+    }
+
+Gauge('weather_cache_lookups', 'Response cache lookups since start', ['cache', 'result'], cache_lookups)
+Gauge('weather_cache_hit_ratio', 'Share of response cache lookups served from cache', ['cache'], cache_hit_ratio)
+
+# Start from the shared persistent cache instead of stampeding the upstream after a deploy
+current_cache.warm_start()
+forecast_cache.warm_start()
+
+# Re-fetch the most requested locations before their entries expire
+weather_client.prefetcher.start()
+
+# Batch items fan out on their own pool so they can't starve the upstream pool they submit to
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "500"))
+batch_pool = ThreadPoolExecutor(max_workers=int(os.getenv("BATCH_CONCURRENCY", "16")))
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    REQUEST_SECONDS.observe(time.perf_counter() - g.request_start,
+                            route=route, method=request.method, status=response.status_code)
+    return response
+
+@app.after_request
+def compress_response(response):
+    if response.status_code != 304 and response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add('Accept-Encoding')
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None or 'Content-Encoding' in response.headers:
+        return response
+    # Weak whenever an encoding is negotiated, even for bodies too small to compress: a 304 can't
+    # tell which its 200 was, and both must carry the same validator
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = weak_etag(response.headers['ETag'])
+    if response.status_code == 304:
+        return response
+
+    if response.is_streamed:
+        compressor = StreamCompressor(encoding)
+        chunks = response.response
+
+        def generate():
+            for chunk in chunks:
+                yield compressor.compress(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield compressor.finish()
+
+        response.response = generate()
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+        response.set_data(compress(body, encoding))
+
+    response.headers['Content-Encoding'] = encoding
+    return response
 
 @app.route('/')
 def home():
     return render_template('index.html')
 
-@app.route('/weather', methods=['POST'])
+@app.route('/metrics')
+def metrics():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/weather', methods=['GET', 'POST'])
 def get_weather():
-    data = request.get_json()
+    # GET takes the same fields as query parameters, so browsers and proxies can cache it
+    if request.method == 'POST':
+        body, status, headers = fetch_weather(request.get_json())
+    else:
+        body, status, headers = fetch_weather(request.args.to_dict(), request.headers.get('If-None-Match'))
+
+    if status == 304:
+        return Response(status=304, headers=headers)
+    return jsonify(body), status, headers
+
+def location_params(data):
+    """Translate a /weather request body into OpenWeather params, or None if it has no location"""
     city = data.get('location')
     lat = data.get('lat')
     lon = data.get('lon')
@@ -32,151 +144,301 @@ def get_weather():
     country = data.get('country', 'us')
 
     params = {
-        'appid': API_KEY,
         'units': units
     }
 
-    forecast_params = {
-        'appid': API_KEY,
-        'units': units,
-    }
-
     if lat is not None and lon is not None:
         params['lat'] = lat
         params['lon'] = lon
-
-        forecast_params['lat'] = lat
-        forecast_params['lon'] = lon
     elif zip_code:
         params['zip'] = f"{zip_code},{country}"
-        forecast_params['zip'] = f"{zip_code},{country}"
-
     elif city:
         params['q'] = city
-        forecast_params['q'] = city
     else:
-        return jsonify({'error': 'Please enter location to fetch weather data'}), 400
+        return None
+
+    return params
+
+def requested_fields(data):
+    """The fields= projection from a request body or query, as a list, or None for everything"""
+    fields = data.get('fields')
+    if isinstance(fields, str):
+        fields = fields.split(',')
+    if not fields:
+        return None
+    return [field.strip() for field in fields if field.strip()] or None
+
+def wants_daily(fields):
+    return fields is None or any(field.split('.')[0] == 'daily' for field in fields)
+
+def project(result, fields):
+    """Keep only the requested fields; daily.<name> keeps <name> in every daily entry"""
+    projected = {}
+    daily_fields = []
+    for field in fields:
+        name, _, sub = field.partition('.')
+        if name == 'daily' and sub:
+            daily_fields.append(sub)
+        elif name in result:
+            projected[name] = result[name]
+
+    if daily_fields and 'daily' not in projected:
+        projected['daily'] = [{name: day[name] for name in daily_fields if name in day} for day in result['daily']]
+    if result.get('stale'):
+        projected['stale'] = True
+    return projected
+
+def served_stale(weather, forecast=None):
+    """True when either payload is the last known good copy, served while the upstream is failing"""
+    return bool(weather.get('stale') or (forecast is not None and forecast[1].get('stale')))
+
+def weather_result(weather, forecast=None, fields=None, daily=None):
+    """Shape the upstream current weather and forecast payloads into the /weather body.
+
+    forecast is the (status, payload) pair, or None when the daily list wasn't requested.
+    daily is the forecast's daily list when it was already built by process_forecasts.
+    """
+    # Convert time(s) using timezone offset
+    def format_time(unix_time, timezone_offset):
+        return datetime.fromtimestamp(unix_time + timezone_offset, tz=timezone.utc).strftime('%I:%M %p')
+
+    def format_local_time(unix_time, timezone_offset):
+        return datetime.fromtimestamp(unix_time + timezone_offset, tz=timezone.utc).strftime('%a, %b %d %I:%M %p')
+
+    result = {
+        "location": f"{weather['name']}, {weather['sys']['country']}",
+        "temp": weather['main']['temp'],
+        "temp_min": weather['main']['temp_min'],
+        "temp_max": weather['main']['temp_max'],
+        "feels_like": weather['main']['feels_like'],
+        "description": weather['weather'][0]['description'],
+        "wind_speed": weather['wind']['speed'],
+        "pressure": weather['main']['pressure'],
+        "humidity": weather['main']['humidity'],
+        "visibility": weather.get('visibility', 'N/A'),
+        "sunrise": format_time(weather['sys']['sunrise'], weather['timezone']),
+        "sunset": format_time(weather['sys']['sunset'], weather['timezone']),
+        "local_time": format_local_time(weather['dt'], weather['timezone']),
+        "weather_icon": weather['weather'][0]['icon']
+    }
 
-    try:
-        response = requests.get(BASE_URL, params=params)
-
-        if response.status_code != 200:
-            weather_error = response.json()
-            return jsonify({'error': weather_error.get('message', 'Weather info not found')}), 404
-        else:
-            weather = response.json()
-            # print("\nRESPONSE:", weather)
-
-            # Convert time(s) using timezone offset
-            def format_time(unix_time, timezone_offset):
-                return datetime.fromtimestamp(unix_time + timezone_offset, tz=timezone.utc).strftime('%I:%M %p')
-
-            def format_local_time(unix_time, timezone_offset):
-                return datetime.fromtimestamp(unix_time + timezone_offset, tz=timezone.utc).strftime('%a, %b %d %I:%M %p')
-
-            result = {
-                "location": f"{weather['name']}, {weather['sys']['country']}",
-                "temp": weather['main']['temp'],
-                "temp_min": weather['main']['temp_min'],
-                "temp_max": weather['main']['temp_max'],
-                "feels_like": weather['main']['feels_like'],
-                "description": weather['weather'][0]['description'],
-                "wind_speed": weather['wind']['speed'],
-                "pressure": weather['main']['pressure'],
-                "humidity": weather['main']['humidity'],
-                "visibility": weather.get('visibility', 'N/A'),
-                "sunrise": format_time(weather['sys']['sunrise'], weather['timezone']),
-                "sunset": format_time(weather['sys']['sunset'], weather['timezone']),
-                "local_time": format_local_time(weather['dt'], weather['timezone']),
-                "weather_icon": weather['weather'][0]['icon']
-            }
-
-            forecast_response = requests.get(FORECAST_URL, params=forecast_params)
-            # print("\n5 DAY FORECAST:", forecast_response)
-
-            if forecast_response.status_code != 200:
-                forecast_error = forecast_response.json()
-                print("Forecast error:", forecast_error)
-                result["daily"] = []
-            else:
-                forecast_data = forecast_response.json()
-                # print("\nFORECAST DATA:", forecast_data)
-                for entry in forecast_data['list']:
-                    print(entry['dt_txt'])
-                result["daily"] = process_forecast_data(forecast_data)
-
-        return jsonify(result)
+    if served_stale(weather, forecast):
+        result["stale"] = True
+
+    if forecast is not None and forecast[0] != 200:
+        print("Forecast error:", forecast[1])
+        result["daily"] = []
+    elif forecast is not None:
+        forecast_data = forecast[1]
+        # print("\nFORECAST DATA:", forecast_data)
+        if logger.isEnabledFor(logging.DEBUG) and random.random() < FORECAST_LOG_SAMPLE_RATE:
+            logger.debug("Forecast slots for %s: %s", result["location"],
+                         [entry['dt_txt'] for entry in forecast_data['list']])
+        if daily is None:
+            with PROCESS_FORECAST_SECONDS.time():
+                daily = process_forecast_data(forecast_data)
+        result["daily"] = daily
+
+    return project(result, fields) if fields else result
+
+def cache_headers(params, weather, forecast=None, fields=None):
+    """ETag and Cache-Control for the /weather body built from these upstream payloads.
+
+    The ETag depends only on the location, the units, the field selection, the
+    upstream observation times, whether a stale copy is served and the city-local
+    day the daily list starts after, so it can be compared before the body is built.
+    """
+    today = None
+    if forecast is None:
+        forecast_dt = None
+        max_age = weather_client.freshness(params, ('weather',))
+    else:
+        status, forecast_data = forecast
+        forecast_dt = forecast_data['list'][0]['dt'] if status == 200 and forecast_data.get('list') else None
+        # A missing forecast shouldn't be reused; the next request may get one
+        max_age = weather_client.freshness(params) if forecast_dt is not None else 0
+        if forecast_dt is not None:
+            # The same forecast yields a shorter daily list once the city's day rolls over
+            today = local_day(forecast_data.get('city', {}).get('timezone', 0))
+
+    stale = served_stale(weather, forecast)
+    if stale:
+        max_age = 0
+
+    validator = (location_key(params), fields, weather['dt'], forecast_dt, today, stale)
+    digest = hashlib.sha1(repr(validator).encode()).hexdigest()[:20]
+    return {
+        'ETag': f'"{digest}"',
+        'Cache-Control': f'public, max-age={max_age}',
+    }
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an If-None-Match header value against etag"""
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or etag in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+def busy(retry_after, message='Weather service is busy, try again shortly'):
+    """503 for requests that couldn't get an upstream call within the quota or while it is down"""
+    return {'error': message}, 503, {'Retry-After': str(retry_after)}
 
+def fetch_weather(data, if_none_match=None, priority=INTERACTIVE, build=weather_result):
+    """Build the /weather response for one location query, returns (body, status, headers).
+
+    If if_none_match matches the response's ETag the body isn't built and
+    (None, 304, headers) is returned. The body is build(weather, forecast, fields).
+    """
+    params = location_params(data)
+    if params is None:
+        return {'error': 'Please enter location to fetch weather data'}, 400, {}
+    fields = requested_fields(data)
+
+    try:
+        futures = [upstream_pool.submit(weather_client.get_current, params, priority)]
+        # The forecast is only fetched when the daily list is part of the response
+        if wants_daily(fields):
+            futures.append(upstream_pool.submit(weather_client.get_forecast, params, priority))
+
+        done, pending = wait(futures, timeout=UPSTREAM_DEADLINE, return_when=FIRST_EXCEPTION)
+        for future in done:
+            future.result()  # surface connection errors from either call right away
+        if pending:
+            for future in pending:
+                future.cancel()
+            return {'error': 'Weather service timed out'}, 504, {}
+
+        status_code, weather = futures[0].result()
+
+        if status_code == 429:
+            return busy(limiter.retry_after())
+        if status_code != 200:
+            return {'error': weather.get('message', 'Weather info not found')}, 404, {}
+
+        forecast = futures[1].result() if len(futures) > 1 else None
+        headers = cache_headers(params, weather, forecast, fields)
+        if if_none_match and etag_matches(if_none_match, headers['ETag']):
+            return None, 304, headers
+
+        return build(weather, forecast, fields), 200, headers
+
+    except RateLimited as e:
+        return busy(e.retry_after)
+    except CircuitOpen as e:
+        return busy(e.retry_after, 'Weather service is unavailable, try again shortly')
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        return {'error': str(e)}, 500, {}
+
+@app.route('/weather/batch', methods=['POST'])
+def get_weather_batch():
+    data = request.get_json()
+    locations = data.get('locations') if isinstance(data, dict) else None
+    if not isinstance(locations, list) or not locations:
+        return jsonify({'error': 'Please provide a non-empty list of locations'}), 400
+    if len(locations) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'A batch can contain at most {BATCH_MAX_ITEMS} locations'}), 400
+
+    defaults = {'units': data.get('units', 'metric')}
+    if data.get('fields'):
+        defaults['fields'] = data['fields']
+    # NDJSON streams each item as soon as it completes instead of waiting for the slowest one
+    stream = data.get('stream') or request.args.get('format') == 'ndjson'
+    futures = {
+        batch_pool.submit(fetch_batch_item, item, defaults, weather_result if stream else deferred_result): index
+        for index, item in enumerate(locations)
+    }
 
-from datetime import datetime, timedelta
-from collections import defaultdict
+    if stream:
+        def generate():
+            for future in as_completed(futures):
+                yield json.dumps(dict(future.result(), index=futures[future])) + "\n"
+
+        return Response(generate(), mimetype='application/x-ndjson')
+
+    results = [None] * len(locations)
+    for future in as_completed(futures):
+        results[futures[future]] = dict(future.result(), index=futures[future])
+    return jsonify({'results': build_batch_results(results)})
+
+def fetch_batch_item(item, defaults, build=weather_result):
+    if not isinstance(item, dict):
+        return {'status': 400, 'error': 'Each location must be an object'}
+
+    body, status, _ = fetch_weather(dict(defaults, **item), priority=BATCH, build=build)
+    if status != 200:
+        return {'status': status, 'error': body['error']}
+    return {'status': status, 'result': body}
+
+def deferred_result(weather, forecast, fields):
+    """fetch_weather build that keeps the payloads, so build_batch_results can aggregate all forecasts at once"""
+    return weather, forecast, fields
+
+def build_batch_results(results):
+    """Turn the deferred_result bodies of a finished batch into /weather bodies.
+
+    Every item's forecast goes through one process_forecasts call instead of
+    one forecast_engine pass per location. An item whose payloads can't be
+    built gets a 500 of its own, as in fetch_weather, without failing the batch.
+    """
+    pending = {
+        index: item['result'][1][1]
+        for index, item in enumerate(results)
+        if item['status'] == 200 and item['result'][1] is not None and item['result'][1][0] == 200
+    }
+    try:
+        with PROCESS_FORECAST_SECONDS.time():
+            daily = dict(zip(pending, process_forecasts(list(pending.values()))))
+    except Exception:
+        # A malformed payload broke the shared pass; redo them one by one so only its item fails
+        daily = {}
+        for index, payload in pending.items():
+            try:
+                daily[index] = process_forecast_data(payload)
+            except Exception as e:
+                daily[index] = e
+
+    built = []
+    for index, item in enumerate(results):
+        if item['status'] == 200:
+            weather, forecast, fields = item['result']
+            try:
+                if isinstance(daily.get(index), Exception):
+                    raise daily[index]
+                item = dict(item, result=weather_result(weather, forecast, fields, daily.get(index)))
+            except Exception as e:
+                item = {'status': 500, 'error': str(e), 'index': item['index']}
+        built.append(item)
+    return built
 
 def process_forecast_data(forecast_data):
-    grouped = defaultdict(list)
-
-    # Group forecast entries by date
-    for entry in forecast_data['list']:
-        date_str = datetime.fromtimestamp(entry['dt']).strftime('%Y-%m-%d')
-        grouped[date_str].append(entry)
-
-    daily_forecast = []
-
-    today_str = datetime.now().strftime('%Y-%m-%d')
-
-    # Sort dates to process in chronological order
-    sorted_dates = sorted(grouped.keys())
-
-    # Start from the next day after today
-    for date_str in sorted_dates:
-        if date_str <= today_str:
-            continue  # Skip today and past dates
-
-        entries = grouped[date_str]
-
-        # Find the entry closest to 15:00:00
-        noon_entry = None
-        for e in entries:
-            dt_txt = e.get('dt_txt', '')
-            if '15:00:00' in dt_txt:
-                noon_entry = e
-                break
-
-        if not noon_entry:
-            for e in entries:
-                dt_txt = e.get('dt_txt', '')
-                if '18:00:00' in dt_txt:
-                    noon_entry = e
-                    break
-
-        # If still not found, fallback to the first entry of the day
-        if not noon_entry:
-            noon_entry = entries[0]
-
-        temps = [e['main']['temp'] for e in entries]
-        min_temp = round(min(temps))
-        max_temp = round(max(temps))
-        description = noon_entry['weather'][0]['description']
-        icon = noon_entry['weather'][0]['icon']
-        wind = round(noon_entry['wind']['speed'], 1)
-        pop = int(noon_entry.get('pop', 0) * 100)
+    return process_forecasts([forecast_data])[0]
 
+def process_forecasts(payloads):
+    """Daily forecast lists for several forecast payloads, aggregated in one forecast_engine pass"""
+    columns = forecast_columns(payloads)
+
+    # One row per city-local day, represented by its 15:00 entry, else 18:00, else the entry nearest 15:00
+    days = daily_aggregates(columns, at_hours(columns['minute'], (15, 18)))
+
+    # Start from the next day after today in each city, stop after 7 days
+    today = np.array([local_day(payload['city'].get('timezone', 0)) for payload in payloads], dtype=np.int64)
+    upcoming = np.flatnonzero(days['day'] > today[days['location']])
+
+    daily = [[] for _ in payloads]
+    for i, date_str in zip(upcoming, day_strings(days['day'][upcoming])):
+        daily_forecast = daily[days['location'][i]]
+        if len(daily_forecast) == 7:
+            continue
+        slot = days['slot'][i]
         daily_forecast.append({
-            "date": date_str,
-            "temp_min": min_temp,
-            "temp_max": max_temp,
-            "description": description,
-            "icon": icon,
-            "wind_speed": wind,
-            "pop": pop
+            "date": str(date_str),
+            "temp_min": round(float(days['temp_min'][i])),
+            "temp_max": round(float(days['temp_max'][i])),
+            "description": columns['description'][slot],
+            "icon": columns['icon'][slot],
+            "wind_speed": round(float(columns['wind_speed'][slot]), 1),
+            "pop": int(float(columns['pop'][slot]) * 100)
         })
 
-        # Stop after 7 days or 8 days, adjust as needed
-        if len(daily_forecast) >= 7:
-            break
-
-    return daily_forecast
+    return daily
 
 
 if __name__ == '__main__':
@@ -0,0 +1,233 @@
+"""ASGI entry point serving the weather API with an async upstream client.
+
+Runs alongside the WSGI app in app.py and returns the same responses, but
+each upstream call is awaited instead of holding a worker thread, so one
+worker can keep hundreds of upstream requests in flight.
+
+    uvicorn asgi:app --workers 4
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker --workers 4
+"""
+import asyncio
+import json
+import os
+import time
+
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.datastructures import MutableHeaders
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import weather_client
+from app import (BATCH_MAX_ITEMS, REQUEST_SECONDS, UPSTREAM_DEADLINE, build_batch_results, busy, cache_headers,
+                 deferred_result, etag_matches, location_params, requested_fields, wants_daily, weather_result)
+from compression import COMPRESS_MIN_BYTES, COMPRESSIBLE_TYPES, StreamCompressor, choose_encoding, compress, weak_etag
+from metrics import render
+from ratelimit import BATCH, INTERACTIVE, RateLimited, limiter
+from resilience import CircuitOpen
+
+# Batch items in flight at once per request; they no longer cost a thread each
+ASYNC_BATCH_CONCURRENCY = int(os.getenv("ASYNC_BATCH_CONCURRENCY", "64"))
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+
+async def fetch_weather_async(data, if_none_match=None, priority=INTERACTIVE, build=weather_result):
+    """Async fetch_weather: build the /weather response, returns (body, status, headers)"""
+    params = location_params(data)
+    if params is None:
+        return {'error': 'Please enter location to fetch weather data'}, 400, {}
+    fields = requested_fields(data)
+
+    try:
+        calls = [weather_client.get_current_async(params, priority)]
+        if wants_daily(fields):
+            calls.append(weather_client.get_forecast_async(params, priority))
+        (status_code, weather), *forecast = await asyncio.wait_for(asyncio.gather(*calls), timeout=UPSTREAM_DEADLINE)
+        forecast = forecast[0] if forecast else None
+
+        if status_code == 429:
+            return busy(limiter.retry_after())
+        if status_code != 200:
+            return {'error': weather.get('message', 'Weather info not found')}, 404, {}
+
+        headers = cache_headers(params, weather, forecast, fields)
+        if if_none_match and etag_matches(if_none_match, headers['ETag']):
+            return None, 304, headers
+
+        return build(weather, forecast, fields), 200, headers
+
+    except asyncio.TimeoutError:
+        return {'error': 'Weather service timed out'}, 504, {}
+    except RateLimited as e:
+        return busy(e.retry_after)
+    except CircuitOpen as e:
+        return busy(e.retry_after, 'Weather service is unavailable, try again shortly')
+    except Exception as e:
+        return {'error': str(e)}, 500, {}
+
+
+async def home(request):
+    return FileResponse(os.path.join(TEMPLATE_DIR, "index.html"))
+
+
+async def get_weather(request):
+    if request.method == 'POST':
+        body, status, headers = await fetch_weather_async(await request.json())
+    else:
+        body, status, headers = await fetch_weather_async(dict(request.query_params),
+                                                          request.headers.get('if-none-match'))
+
+    if status == 304:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, status_code=status, headers=headers)
+
+
+async def get_weather_batch(request):
+    data = await request.json()
+    locations = data.get('locations') if isinstance(data, dict) else None
+    if not isinstance(locations, list) or not locations:
+        return JSONResponse({'error': 'Please provide a non-empty list of locations'}, status_code=400)
+    if len(locations) > BATCH_MAX_ITEMS:
+        return JSONResponse({'error': f'A batch can contain at most {BATCH_MAX_ITEMS} locations'}, status_code=400)
+
+    defaults = {'units': data.get('units', 'metric')}
+    if data.get('fields'):
+        defaults['fields'] = data['fields']
+    semaphore = asyncio.Semaphore(ASYNC_BATCH_CONCURRENCY)
+    stream = data.get('stream') or request.query_params.get('format') == 'ndjson'
+
+    async def fetch_item(index, item):
+        if not isinstance(item, dict):
+            return {'status': 400, 'error': 'Each location must be an object', 'index': index}
+
+        async with semaphore:
+            body, status, _ = await fetch_weather_async(dict(defaults, **item), priority=BATCH,
+                                                        build=weather_result if stream else deferred_result)
+        if status != 200:
+            return {'status': status, 'error': body['error'], 'index': index}
+        return {'status': status, 'result': body, 'index': index}
+
+    tasks = [asyncio.ensure_future(fetch_item(index, item)) for index, item in enumerate(locations)]
+
+    if stream:
+        async def generate():
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+    return JSONResponse({'results': build_batch_results(await asyncio.gather(*tasks))})
+
+
+async def metrics(request):
+    return Response(render(), media_type='text/plain; version=0.0.4')
+
+
+class RequestMetrics:
+    """ASGI middleware recording end-to-end latency like the Flask app's after_request hook"""
+
+    def __init__(self, app, routes):
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status[0] = message['status']
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope['path'] if scope['path'] in self.routes else 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - start,
+                                    route=route, method=scope['method'], status=status[0])
+
+
+class Compression:
+    """ASGI middleware compressing API responses per Accept-Encoding, like app.py's compress_response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        accept_encoding = dict(scope['headers']).get(b'accept-encoding', b'').decode('latin-1')
+        encoding = choose_encoding(accept_encoding)
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+            if start is None or message['type'] != 'http.response.body':
+                return await send(message)
+
+            headers = MutableHeaders(raw=list(start['headers']))
+            response_start, start = start, None
+            media_type = headers.get('content-type', '').split(';')[0].strip()
+            if response_start['status'] != 304 and media_type not in COMPRESSIBLE_TYPES:
+                await send(response_start)
+                return await send(message)
+            headers.add_vary_header('Accept-Encoding')
+
+            body = message.get('body', b'')
+            streamed = message.get('more_body', False)
+            # Weak whenever an encoding is negotiated, as in app.py, so a 304 matches its 200's validator
+            if encoding is not None and 'content-encoding' not in headers and 'etag' in headers:
+                headers['etag'] = weak_etag(headers['etag'])
+            if (encoding is None or response_start['status'] == 304 or 'content-encoding' in headers
+                    or (not streamed and len(body) < COMPRESS_MIN_BYTES)):
+                await send(dict(response_start, headers=headers.raw))
+                return await send(message)
+
+            headers['content-encoding'] = encoding
+            if streamed:
+                del headers['content-length']
+                compressor = StreamCompressor(encoding)
+                body = compressor.compress(body)
+            else:
+                body = compress(body, encoding)
+                headers['content-length'] = str(len(body))
+            await send(dict(response_start, headers=headers.raw))
+            await send({'type': 'http.response.body', 'body': body, 'more_body': streamed})
+
+        async def send_wrapper(message):
+            # Body chunks after the first one of a compressed stream
+            if compressor is not None and message['type'] == 'http.response.body':
+                more_body = message.get('more_body', False)
+                body = compressor.compress(message.get('body', b''))
+                if not more_body:
+                    body += compressor.finish()
+                return await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+            await send_compressed(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    yield
+    await weather_client.close_async_client()
+
+
+routes = [
+    Route('/', home),
+    Route('/weather', get_weather, methods=['GET', 'POST']),
+    Route('/weather/batch', get_weather_batch, methods=['POST']),
+    Route('/metrics', metrics),
+]
+
+app = RequestMetrics(Compression(Starlette(routes=routes, lifespan=lifespan)), {route.path for route in routes})
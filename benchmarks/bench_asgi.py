@@ -0,0 +1,64 @@
+"""Requests/sec per worker: sync WSGI app (gunicorn) vs ASGI app (uvicorn).
+
+Both servers run a single worker against the local fake OpenWeather server
+with caching disabled, so every request waits on two upstream calls. The sync
+worker can only serve one request at a time; the async worker keeps them all
+in flight.
+
+    python benchmarks/bench_asgi.py --latency 0.1 --concurrency 64 --requests 500
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from types import SimpleNamespace
+
+from fake_openweather import start_server
+from loadtest import ROOT, drive_http, free_port, wait_for_port
+
+SERVERS = {
+    "wsgi (gunicorn sync)": lambda port: ["-m", "gunicorn", "app:app", "--workers", "1",
+                                          "--log-level", "warning", "--bind", f"127.0.0.1:{port}"],
+    "asgi (uvicorn)": lambda port: ["-m", "uvicorn", "asgi:app", "--workers", "1",
+                                    "--log-level", "warning", "--host", "127.0.0.1", "--port", str(port)],
+}
+
+
+def serve(label, env, args):
+    port = free_port()
+    process = subprocess.Popen([sys.executable] + SERVERS[label](port), cwd=ROOT, env=env)
+    try:
+        wait_for_port(port)
+        return drive_http(f"http://127.0.0.1:{port}", args)
+    finally:
+        process.terminate()
+        process.wait(timeout=15)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--locations", type=int, default=500)
+    cli = parser.parse_args()
+
+    fake, base_url = start_server(cli.latency)
+    env = dict(os.environ, OPENWEATHER_API_BASE=base_url, OPENWEATHER_API_KEY="bench",
+               PERSISTENT_CACHE="0", CURRENT_CACHE_TTL="0", FORECAST_CACHE_TTL="0",
+               CACHE_STALE_TTL="0")
+    args = SimpleNamespace(concurrency=cli.concurrency, requests=cli.requests, locations=cli.locations, seed=1)
+
+    results = {label: serve(label, env, args) for label in SERVERS}
+    fake.shutdown()
+
+    for label, stats in results.items():
+        print(f"{label:<22} {stats['throughput_rps']:8.1f} req/s per worker   "
+              f"p50 {stats['p50_ms']} ms   p99 {stats['p99_ms']} ms   errors {stats['errors']}")
+    sync, concurrent = (stats['throughput_rps'] for stats in results.values())
+    print(f"speedup                {concurrent / sync:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Rows/sec of weather_CRUD.py bulk import, serial vs a worker pool with batched transactions.
+
+Writes a CSV of trip rows spread over a set of locations, then imports it
+into a scratch database against the fake OpenWeather server. The serial run
+uses one worker and one transaction per row, like the interactive create
+flow; the others use a worker pool and IMPORT_BATCH_SIZE records per
+transaction. Caches and the geocodes table are reset between runs.
+
+    python benchmarks/bench_bulk_import.py --rows 1000 --locations 200 --latency 0.05
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+import weather_CRUD
+import weather_client
+from fake_openweather import start_server
+from geo import cell_index
+from weather_cache import current_cache, forecast_cache
+
+
+def write_rows(path, rows, locations):
+    start = date.today()
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("label,location_type,location,start,end\n")
+        for i in range(rows):
+            first = start + timedelta(days=i % 3)
+            f.write(f"Trip {i},city,City{i % locations},{first},{first + timedelta(days=1)}\n")
+
+
+def run(tmp, path, workers, batch_size):
+    current_cache.clear()
+    forecast_cache.clear()
+    cell_index.clear()
+    database.close_connections()
+    database.DATABASE_NAME = os.path.join(tmp, f"import-{workers}-{batch_size}.db")
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+        start = time.perf_counter()
+        failed = weather_CRUD.import_records(path, workers, batch_size)
+        elapsed = time.perf_counter() - start
+    return elapsed, failed, database.count_records()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--locations", type=int, default=200, help="distinct cities the rows are spread over")
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency in seconds")
+    parser.add_argument("--workers", default="1,8,32", help="comma-separated worker counts to compare")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency)
+    weather_client.WEATHER_URL = f"{base_url}/data/2.5/weather"
+    weather_client.FORECAST_URL = f"{base_url}/data/2.5/forecast"
+    weather_client.ENDPOINTS['weather'] = (current_cache, weather_client.WEATHER_URL)
+    weather_client.ENDPOINTS['forecast'] = (forecast_cache, weather_client.FORECAST_URL)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "trips.csv")
+        write_rows(path, args.rows, args.locations)
+        print(f"{'workers':>8} {'batch':>6} {'seconds':>8} {'rows/s':>8} {'records':>8} {'failed':>7}")
+        for workers in map(int, args.workers.split(",")):
+            batch_size = 1 if workers == 1 else weather_CRUD.IMPORT_BATCH_SIZE
+            elapsed, failed, records = run(tmp, path, workers, batch_size)
+            print(f"{workers:8d} {batch_size:6d} {elapsed:8.2f} {args.rows / elapsed:8.1f} {records:8d} {failed:7d}")
+        database.close_connections()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare /weather latency with serial vs concurrent upstream calls.
+
+Runs app.py against the local fake OpenWeather server. The serial baseline is
+reproduced by giving the app a single-worker upstream pool, which makes the
+current weather and forecast calls run back to back like they used to.
+
+    python benchmarks/bench_concurrent_fetch.py --latency 0.1 --requests 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as weather_app
+from fake_openweather import start_server
+from weather_cache import current_cache, forecast_cache
+
+
+def run(client, count):
+    timings = []
+    for _ in range(count):
+        # Measure the upstream path, not the response cache
+        current_cache.clear()
+        forecast_cache.clear()
+        start = time.perf_counter()
+        response = client.post("/weather", json={"location": "Benchville", "units": "metric"})
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_json()
+    return timings
+
+
+def summarize(label, timings):
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1000
+    p95 = timings[int(len(timings) * 0.95) - 1] * 1000
+    print(f"{label:<12} p50 {p50:8.1f} ms   p95 {p95:8.1f} ms")
+    return p50
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="fake upstream latency in seconds")
+    parser.add_argument("--requests", type=int, default=50, help="requests per mode")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency)
+    weather_app.weather_client.WEATHER_URL = f"{base_url}/data/2.5/weather"
+    weather_app.weather_client.FORECAST_URL = f"{base_url}/data/2.5/forecast"
+    client = weather_app.app.test_client()
+
+    concurrent_pool = weather_app.upstream_pool
+    weather_app.upstream_pool = ThreadPoolExecutor(max_workers=1)
+    serial = summarize("serial", run(client, args.requests))
+
+    weather_app.upstream_pool = concurrent_pool
+    concurrent = summarize("concurrent", run(client, args.requests))
+
+    print(f"speedup      {serial / concurrent:.2f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Measure the win from the pooled keep-alive session in weather_client.
+
+Issues the same sequence of current-weather calls against the local fake
+OpenWeather server twice: once with a bare requests.get per call (a new TCP
+connection every time, like the entry points used to do) and once through
+weather_client.get_json, which reuses connections from its session pool.
+
+    python benchmarks/bench_connection_reuse.py --requests 500 --threads 4
+
+The stand-in server speaks plain HTTP, so the numbers only include the TCP
+handshake; against the real API each new connection also pays a TLS handshake
+and the gap is considerably wider.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import requests
+import weather_client
+from fake_openweather import start_server
+
+
+def bare_get(url, params):
+    response = requests.get(url, params=params, timeout=weather_client.TIMEOUTS['weather'])
+    return response.status_code, response.json()
+
+
+def pooled_get(url, params):
+    return weather_client.get_json(url, params, 'weather')
+
+
+def run(label, fetch, url, count, threads):
+    def timed(i):
+        start = time.perf_counter()
+        status_code, _ = fetch(url, {'q': f"City{i % 50}", 'units': 'metric'})
+        assert status_code == 200
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        timings = sorted(pool.map(timed, range(count)))
+    elapsed = time.perf_counter() - start
+
+    p50 = statistics.median(timings) * 1000
+    p99 = timings[int(len(timings) * 0.99) - 1] * 1000
+    print(f"{label:<8} {count / elapsed:8.0f} req/s   p50 {p50:6.2f} ms   p99 {p99:6.2f} ms")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    server, base_url = start_server()
+    url = f"{base_url}/data/2.5/weather"
+
+    bare = run("bare", bare_get, url, args.requests, args.threads)
+    pooled = run("pooled", pooled_get, url, args.requests, args.threads)
+    print(f"speedup  {bare / pooled:.2f}x")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Per-operation latency of the database.py CRUD functions.
+
+Runs every operation against a scratch database twice: once with the old
+behaviour (a fresh sqlite3.connect per call in rollback-journal mode) and once
+with the reused, WAL-tuned per-thread connection.
+
+    python benchmarks/bench_database.py --operations 2000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+
+WEATHER = {
+    'temp': 21.5, 'temp_min': 18.0, 'temp_max': 24.1, 'feels_like': 21.0,
+    'description': 'clear sky', 'local_time': 'Mon, Jan 01 03:00 PM', 'weather_icon': '01d',
+}
+
+
+def timed(fn, count):
+    timings = []
+    for i in range(count):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1e6
+
+
+def run(count):
+    ids = []
+    results = {}
+    results['create'] = timed(lambda i: ids.append(database.create_weather_record(
+        f"Trip {i}", 'city', 'London, GB', '2024-01-01', '2024-01-01', WEATHER)), count)
+    results['get_by_id'] = timed(lambda i: database.get_record_by_id(ids[i]), count)
+    results['update'] = timed(lambda i: database.update_record_label(ids[i], f"Renamed {i}"), count)
+    results['delete'] = timed(lambda i: database.delete_record(ids[i]), count)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--operations", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Before: a new connection per call, default journal mode
+        database.DATABASE_NAME = os.path.join(tmp, "before.db")
+        pooled_connect = database.get_connection
+        database.get_connection = lambda: sqlite3.connect(database.DATABASE_NAME)
+        database.init_database()
+        before = run(args.operations)
+
+        # After: the per-thread pooled connection with WAL and tuned pragmas
+        database.DATABASE_NAME = os.path.join(tmp, "after.db")
+        database.get_connection = pooled_connect
+        database.init_database()
+        after = run(args.operations)
+        database.close_connections()
+
+    print(f"{'operation':<12} {'before (us)':>12} {'after (us)':>12} {'speedup':>8}")
+    for name in before:
+        print(f"{name:<12} {before[name]:12.1f} {after[name]:12.1f} {before[name] / after[name]:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
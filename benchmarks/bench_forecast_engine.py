@@ -0,0 +1,125 @@
+"""Daily forecast aggregation: per-entry Python loop vs forecast_engine.
+
+Aggregates the same set of 5 day / 3 hour payloads three ways: the previous
+per-entry loop (datetime.fromtimestamp/strftime and dt_txt substring checks),
+forecast_engine one payload at a time, and forecast_engine over all payloads
+in a single pass. First checks that forecast_engine picks the same days,
+min/max and representative entries as a plain loop over city-local time, for
+every start slot and for offsets that aren't a multiple of 3 hours.
+
+    python benchmarks/bench_forecast_engine.py --locations 500
+"""
+import argparse
+import copy
+import os
+import sys
+import time
+
+from collections import defaultdict
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_openweather import forecast_payload
+from forecast_engine import forecast_columns, daily_aggregates, at_hours
+
+# UTC offsets in hours, most of them off the 3 hour grid (New York, Paris, India, China, Nepal, ...)
+CHECK_OFFSETS = (0, -5, 1, 5.5, 8, 5.75, -3.5, 9.5, 12, -12, 3)
+
+
+def legacy_daily(forecast_data):
+    """The aggregation process_forecast_data used to do, kept here as the baseline"""
+    grouped = defaultdict(list)
+    for entry in forecast_data['list']:
+        grouped[datetime.fromtimestamp(entry['dt']).strftime('%Y-%m-%d')].append(entry)
+
+    daily = []
+    for date_str in sorted(grouped):
+        entries = grouped[date_str]
+        slot = next((e for e in entries if '15:00:00' in e.get('dt_txt', '')), None)
+        if not slot:
+            slot = next((e for e in entries if '18:00:00' in e.get('dt_txt', '')), entries[0])
+        temps = [e['main']['temp'] for e in entries]
+        daily.append((date_str, min(temps), max(temps), slot['weather'][0]['icon']))
+    return daily
+
+
+def reference_daily(forecast_data):
+    """(date, min, max, representative dt) per city-local day: 15:00, else 18:00, else nearest 15:00, later on ties"""
+    offset = forecast_data['city']['timezone']
+    grouped = defaultdict(list)
+    for entry in forecast_data['list']:
+        local = datetime.fromtimestamp(entry['dt'] + offset, tz=timezone.utc)
+        grouped[local.strftime('%Y-%m-%d')].append((local.hour * 60 + local.minute, entry))
+
+    daily = []
+    for date_str in sorted(grouped):
+        entries = grouped[date_str]
+        slot = next((e for m, e in entries if m == 15 * 60), None)
+        if slot is None:
+            slot = next((e for m, e in entries if m == 18 * 60), None)
+        if slot is None:
+            slot = min(entries, key=lambda pair: (abs(pair[0] - 15 * 60), pair[0] < 15 * 60))[1]
+        temps = [e['main']['temp'] for _, e in entries]
+        daily.append((date_str, min(temps), max(temps), slot['dt']))
+    return daily
+
+
+def check():
+    """Compare forecast_engine, batched, with reference_daily for every offset and 3-hourly start slot"""
+    payloads = []
+    for offset in CHECK_OFFSETS:
+        for shift in range(8):
+            payload = copy.deepcopy(forecast_payload(timezone_offset=int(offset * 3600)))
+            for entry in payload['list']:
+                entry['dt'] += shift * 10800
+            payloads.append(payload)
+
+    columns = forecast_columns(payloads)
+    days = daily_aggregates(columns, at_hours(columns['minute'], (15, 18)))
+    engine = defaultdict(list)
+    for location, day, low, high, slot in zip(days['location'], days['day'], days['temp_min'], days['temp_max'],
+                                              days['slot']):
+        date_str = datetime.fromtimestamp(int(day) * 86400, tz=timezone.utc).strftime('%Y-%m-%d')
+        engine[int(location)].append((date_str, float(low), float(high), int(columns['dt'][slot])))
+
+    for i, payload in enumerate(payloads):
+        expected = reference_daily(payload)
+        assert engine[i] == expected, f"offset {payload['city']['timezone']}s: {engine[i]} != {expected}"
+    print(f"engine matches the reference for {len(payloads)} payloads ({len(CHECK_OFFSETS)} offsets x 8 start slots)")
+
+
+def engine_daily(payloads):
+    columns = forecast_columns(payloads)
+    return daily_aggregates(columns, at_hours(columns['minute'], (15, 18)))
+
+
+def timed(label, fn, repeat=5):
+    best = min(_once(fn) for _ in range(repeat))
+    print(f"{label:<22} {best * 1000:8.2f} ms")
+    return best
+
+
+def _once(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=500)
+    args = parser.parse_args()
+
+    check()
+    payloads = [forecast_payload(f"City{i}", timezone_offset=(i % 24 - 12) * 3600) for i in range(args.locations)]
+
+    legacy = timed("legacy loop", lambda: [legacy_daily(p) for p in payloads])
+    single = timed("engine per payload", lambda: [engine_daily(p) for p in payloads])
+    batched = timed("engine batched", lambda: engine_daily(payloads))
+    print(f"speedup (batched)      {legacy / batched:8.1f}x")
+    print(f"speedup (per payload)  {legacy / single:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Insert and range-query throughput of the forecast_points time-series table.
+
+Fills a scratch database the way repeated fetches do: one forecast (40
+3-hourly points) per location per window, windows in time order. The
+WITHOUT ROWID table clustered on (location_id, ts) is compared with an
+ordinary rowid table plus a unique (location_id, ts) index holding the same
+rows. Then random 5 and 30 day windows are read back with
+database.query_forecast_points.
+
+    python benchmarks/bench_forecast_series.py --locations 500 --days 250 --queries 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+
+START = 1_700_000_000 // 10800 * 10800
+POINTS_PER_FETCH = 40
+CONDITIONS = [("clear sky", "01d"), ("light rain", "10d"), ("overcast clouds", "04n"), ("snow", "13d")]
+
+
+def forecast(window, rng):
+    """One fetch worth of points starting at window"""
+    points = []
+    for i in range(POINTS_PER_FETCH):
+        ts = START + (window * POINTS_PER_FETCH + i) * 10800
+        temp = round(rng.uniform(-10, 35), 2)
+        description, icon = rng.choice(CONDITIONS)
+        points.append((ts, 3600, temp, temp - 1, temp - 2, temp + 2, 1013, rng.randint(20, 100),
+                       round(rng.uniform(0, 15), 2), rng.randint(0, 359), rng.randint(0, 100),
+                       round(rng.random(), 2), description, icon))
+    return points
+
+
+def fill(args):
+    rng = random.Random(1)
+    windows = args.days * 8 // POINTS_PER_FETCH
+    start = time.perf_counter()
+    for window in range(windows):
+        for location_id in range(1, args.locations + 1):
+            database.store_forecast_points(location_id, forecast(window, rng))
+    elapsed = time.perf_counter() - start
+    return windows * args.locations * POINTS_PER_FETCH, elapsed
+
+
+def query(args, days):
+    rng = random.Random(2)
+    span = args.days * 86400 - days * 86400
+    points = 0
+    start = time.perf_counter()
+    for _ in range(args.queries):
+        first = START + rng.randrange(span)
+        points += len(database.query_forecast_points(rng.randint(1, args.locations), first, first + days * 86400 - 1))
+    elapsed = time.perf_counter() - start
+    return args.queries / elapsed, points / elapsed, elapsed / args.queries * 1e6
+
+
+def run(label, path, args, rowid):
+    database.close_connections()
+    database.DATABASE_NAME = path
+    database.init_database()
+    if rowid:
+        conn = database.get_connection()
+        conn.execute('DROP TABLE forecast_points')
+        conn.execute('''
+            CREATE TABLE forecast_points (
+                location_id INTEGER NOT NULL, ts INTEGER NOT NULL, utc_offset INTEGER NOT NULL,
+                temp REAL, feels_like REAL, temp_min REAL, temp_max REAL, pressure INTEGER, humidity INTEGER,
+                wind_speed REAL, wind_deg INTEGER, clouds INTEGER, pop REAL, condition_id INTEGER
+            )
+        ''')
+        conn.execute('CREATE UNIQUE INDEX idx_forecast_points ON forecast_points (location_id, ts)')
+        conn.commit()
+
+    total, elapsed = fill(args)
+    database.get_connection().execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    size = os.path.getsize(path) / 2 ** 20
+    print(f"{label}: inserted {total} points in {elapsed:.1f}s ({total / elapsed:,.0f} points/s), {size:.0f} MiB")
+    for days in (5, 30):
+        per_second, points_per_second, mean_us = query(args, days)
+        print(f"  {days:>2} day range: {per_second:8,.0f} queries/s   {points_per_second:10,.0f} points/s   "
+              f"{mean_us:6.0f} us/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=500)
+    parser.add_argument("--days", type=int, default=250, help="days of 3-hourly points per location")
+    parser.add_argument("--queries", type=int, default=2000, help="range queries per window size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run("rowid table + (location_id, ts) index", os.path.join(tmp, "rowid.db"), args, rowid=True)
+        run("WITHOUT ROWID, primary key (location_id, ts)", os.path.join(tmp, "clustered.db"), args, rowid=False)
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
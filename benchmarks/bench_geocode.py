@@ -0,0 +1,105 @@
+"""Upstream calls and latency per CLI record create, before and after the geocodes table.
+
+Simulates several CLI sessions, each creating records for the same mix of
+city names (typed with varying case and country suffixes), ZIP codes and
+coordinates. Caches are cleared between sessions, as each run of
+weather_CRUD.py is a new process. Before: validate with current weather, then
+fetch the forecast for the location as typed. After: validate_location and
+fetch_weather_data_range, which resolve through the persistent geocodes table
+and fetch the forecast by coordinates.
+
+    python benchmarks/bench_geocode.py --sessions 3 --locations 30 --latency 0.05
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from datetime import date
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+import weather_CRUD
+import weather_client
+from fake_openweather import start_server
+from geo import cell_index
+from ratelimit import CRUD
+from weather_cache import current_cache, forecast_cache
+
+
+def locations(count):
+    """(location_type, location) pairs; every third city is a re-spelling of an earlier one"""
+    pairs = []
+    for i in range(count):
+        if i % 3 == 0:
+            pairs.append(('zip', f"{10000 + i}"))
+        elif i % 3 == 1:
+            pairs.append(('latlon', f"{40 + i / 100:.4f},{-74 - i / 100:.4f}"))
+        elif i % 6 == 2:
+            pairs.append(('city', f"City{i}"))
+        else:
+            pairs.append(('city', f"city{i - 3},US"))
+    return pairs
+
+
+def before(location_type, location, day):
+    params = weather_CRUD.location_params(location_type, location)
+    status_code, _ = weather_client.get_current(params, priority=CRUD)
+    if status_code == 200:
+        weather_client.get_forecast(params, priority=CRUD)
+
+
+def after(location_type, location, day):
+    is_valid, place = weather_CRUD.validate_location(location_type, location)
+    if is_valid:
+        weather_CRUD.fetch_weather_data_range(place, day, day)
+
+
+def run(create, pairs, sessions, server):
+    server.request_counts.clear()
+    timings = []
+    day = date.today().isoformat()
+    for _ in range(sessions):
+        current_cache.clear()
+        forecast_cache.clear()
+        cell_index.clear()
+        for location_type, location in pairs:
+            start = time.perf_counter()
+            create(location_type, location, day)
+            timings.append(time.perf_counter() - start)
+    calls = sum(server.request_counts.values())
+    return calls / len(timings), statistics.median(timings) * 1000, dict(server.request_counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=3, help="CLI runs, with cold in-memory caches")
+    parser.add_argument("--locations", type=int, default=30, help="locations created per session")
+    parser.add_argument("--latency", type=float, default=0.05, help="upstream latency in seconds")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency)
+    weather_client.WEATHER_URL = f"{base_url}/data/2.5/weather"
+    weather_client.FORECAST_URL = f"{base_url}/data/2.5/forecast"
+    weather_client.ZIP_URL = f"{base_url}/geo/1.0/zip"
+    weather_client.REVERSE_URL = f"{base_url}/geo/1.0/reverse"
+    weather_client.ENDPOINTS['weather'] = (current_cache, weather_client.WEATHER_URL)
+    weather_client.ENDPOINTS['forecast'] = (forecast_cache, weather_client.FORECAST_URL)
+    pairs = locations(args.locations)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_NAME = os.path.join(tmp, "records.db")
+        database.init_database()
+        print(f"{'':<30} {'upstream calls/create':>22} {'median create (ms)':>19}")
+        for label, create in (("validate + forecast as typed", before), ("geocodes table", after)):
+            per_create, median_ms, counts = run(create, pairs, args.sessions, server)
+            print(f"{label:<30} {per_create:22.2f} {median_ms:19.1f}   {counts}")
+        database.close_connections()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
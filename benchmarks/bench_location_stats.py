@@ -0,0 +1,94 @@
+"""Weekly per-location temperature summary: full GROUP BY scan of weather_records vs location_daily_stats.
+
+Fills scratch databases of increasing size with records spread over a fixed
+set of locations and days, then times the weekly summary both ways. The
+stats table is maintained by triggers, so insert throughput is also measured
+with and without them.
+
+    python benchmarks/bench_location_stats.py --records 20000,200000,1000000 --locations 50 --days 90
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import database
+
+SCAN = '''
+    SELECT location_id, date(start_date, '-6 days', 'weekday 1') AS week, COUNT(*), AVG(temp),
+           MIN(temp_min), MAX(temp_max)
+    FROM weather_records
+    WHERE location_id IS NOT NULL
+    GROUP BY location_id, week
+'''
+
+
+def fill(count, args, batch_size=1000):
+    rng = random.Random(count)
+    first = date.today()
+    days = [(first + timedelta(days=i)).isoformat() for i in range(args.days)]
+    start = time.perf_counter()
+    for offset in range(0, count, batch_size):
+        batch = []
+        for _ in range(min(batch_size, count - offset)):
+            day = rng.choice(days)
+            temp = round(rng.uniform(-5, 30), 1)
+            batch.append({
+                'label': 'Bench', 'location_type': 'city', 'location': 'Bench', 'start_date': day, 'end_date': day,
+                'location_id': rng.randint(1, args.locations),
+                'weather_data': {'temp': temp, 'temp_min': temp - 2, 'temp_max': temp + 2},
+            })
+        database.create_weather_records(batch)
+    return count / (time.perf_counter() - start)
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", default="20000,200000", help="comma-separated table sizes")
+    parser.add_argument("--locations", type=int, default=50)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'records':>9} {'inserts/s':>10} {'no triggers':>12} {'scan (ms)':>10} {'stats (ms)':>11} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in map(int, args.records.split(",")):
+            # Baseline insert rate: same schema without the stats triggers
+            database.close_connections()
+            database.DATABASE_NAME = os.path.join(tmp, f"plain-{count}.db")
+            database.init_database()
+            conn = database.get_connection()
+            for trigger in ('insert', 'delete', 'update'):
+                conn.execute(f'DROP TRIGGER weather_records_stats_{trigger}')
+            plain_rate = fill(count, args)
+
+            database.close_connections()
+            database.DATABASE_NAME = os.path.join(tmp, f"stats-{count}.db")
+            database.init_database()
+            rate = fill(count, args)
+
+            conn = database.get_connection()
+            scan_ms = timed(lambda: conn.execute(SCAN).fetchall(), args.repeat)
+            stats_ms = timed(lambda: database.query_location_stats('week'), args.repeat)
+            print(f"{count:9d} {rate:10,.0f} {plain_rate:12,.0f} {scan_ms:10.1f} {stats_ms:11.1f} {scan_ms / stats_ms:7.0f}x")
+        database.close_connections()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Compare /weather/batch bytes on the wire and server time for full, projected and compressed responses.
+
+Runs app.py against the local fake OpenWeather server with the caches warm,
+so the numbers are dominated by building, serializing and compressing the body.
+
+    python benchmarks/bench_payload_size.py --locations 500 --rounds 5
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as weather_app
+import compression
+from fake_openweather import start_server
+
+
+def measure(client, body, headers, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        response = client.post("/weather/batch", json=body, headers=headers)
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_json()
+    return len(response.get_data()), min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--locations", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    server, base_url = start_server()
+    weather_app.weather_client.WEATHER_URL = f"{base_url}/data/2.5/weather"
+    weather_app.weather_client.FORECAST_URL = f"{base_url}/data/2.5/forecast"
+    weather_app.weather_client.prefetcher.stop()
+    client = weather_app.app.test_client()
+
+    full = {"locations": [{"location": f"City{i}"} for i in range(args.locations)]}
+    widget = dict(full, fields="temp,weather_icon,daily.temp_max")
+    client.post("/weather/batch", json=full)  # warm the caches
+
+    modes = [
+        ("full", full, {}),
+        ("full gzip", full, {"Accept-Encoding": "gzip"}),
+        ("fields", widget, {}),
+        ("fields gzip", widget, {"Accept-Encoding": "gzip"}),
+    ]
+    if compression.brotli:
+        modes.insert(2, ("full br", full, {"Accept-Encoding": "br"}))
+        modes.append(("fields br", widget, {"Accept-Encoding": "br"}))
+
+    baseline = None
+    for label, body, headers in modes:
+        size, seconds = measure(client, body, headers, args.rounds)
+        baseline = baseline or size
+        print(f"{label:<12} {size:>10,} bytes ({size / baseline:6.1%})   {seconds * 1000:8.1f} ms")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Drive more traffic than the upstream quota allows, without and with the rate limiter.
+
+The fake OpenWeather server enforces a quota over a short trailing window and
+answers 429 beyond it. Interactive and batch callers request distinct
+locations (so every request is an upstream call) faster than the quota.
+Reports upstream 429s, the share of the quota used, and latency and outcome
+per priority. The baseline still pauses after each 429, like the app did
+before a quota was configured.
+
+    python benchmarks/bench_rate_limiter.py --quota 100 --window 5 --duration 15
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as weather_app
+import ratelimit
+from fake_openweather import start_server
+from loadtest import summarize
+from weather_cache import current_cache, forecast_cache
+
+
+def run(args, server):
+    deadline = time.perf_counter() + args.duration
+    timings = {ratelimit.INTERACTIVE: [], ratelimit.BATCH: []}
+    statuses = {ratelimit.INTERACTIVE: Counter(), ratelimit.BATCH: Counter()}
+    sequence = iter(range(10 ** 9))
+
+    def caller(priority, pause):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            body, status, _ = weather_app.fetch_weather(
+                {"location": f"City{next(sequence)}", "fields": "temp"}, priority=priority)
+            timings[priority].append(time.perf_counter() - start)
+            statuses[priority][status] += 1
+            time.sleep(pause)
+
+    server.request_counts.clear()
+    threads = [threading.Thread(target=caller, args=(ratelimit.INTERACTIVE, 0.05)) for _ in range(args.interactive)]
+    threads += [threading.Thread(target=caller, args=(ratelimit.BATCH, 0)) for _ in range(args.batch)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    served = server.request_counts["weather"]
+    allowed = args.quota * args.duration / args.window
+    print(f"  upstream 429s {server.request_counts['throttled']:>6}   quota used {served / allowed:6.1%}")
+    for priority, name in ((ratelimit.INTERACTIVE, "interactive"), (ratelimit.BATCH, "batch")):
+        stats = summarize(timings[priority], 0, args.duration)
+        print(f"  {name:<12} p50 {stats['p50_ms']:8.1f} ms   p95 {stats['p95_ms']:8.1f} ms   "
+              f"statuses {dict(statuses[priority])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quota", type=int, default=100, help="upstream calls allowed per window")
+    parser.add_argument("--window", type=float, default=5.0, help="quota window in seconds")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per mode")
+    parser.add_argument("--interactive", type=int, default=4, help="interactive callers")
+    parser.add_argument("--batch", type=int, default=8, help="batch callers, with no pause between requests")
+    args = parser.parse_args()
+
+    server, base_url = start_server(quota=args.quota, quota_window=args.window)
+    weather_app.weather_client.WEATHER_URL = f"{base_url}/data/2.5/weather"
+    weather_app.weather_client.FORECAST_URL = f"{base_url}/data/2.5/forecast"
+    weather_app.weather_client.prefetcher.stop()
+    current_cache.stale_ttl = forecast_cache.stale_ttl = 0
+
+    print("429 backoff only, no token bucket")
+    ratelimit.limiter = ratelimit.RateLimiter(None)
+    weather_app.weather_client.limiter = ratelimit.limiter
+    run(args, server)
+
+    # Let the fake's window drain so the second run starts from a full quota
+    time.sleep(args.window)
+    print("token bucket + priority queue")
+    burst = min(ratelimit.RATE_LIMIT_BURST, args.quota / 2)
+    ratelimit.limiter = ratelimit.RateLimiter((args.quota - burst) / args.window, burst)
+    weather_app.weather_client.limiter = ratelimit.limiter
+    run(args, server)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
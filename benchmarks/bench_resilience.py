@@ -0,0 +1,87 @@
+"""Measure /weather tail latency with request hedging, and response times during an upstream outage.
+
+Hedging: the fake OpenWeather server stalls a share of requests, and every
+request misses the cache. The run is repeated with HEDGE_REQUESTS off and on.
+
+Outage: the cached locations expire, then every upstream call fails. The
+breaker opens after BREAKER_FAILURE_THRESHOLD failures and the last known
+good payloads are served, marked stale, with no upstream call.
+
+    python benchmarks/bench_resilience.py --requests 300 --slow-rate 0.03 --slow-latency 1
+"""
+import argparse
+import os
+import sys
+import time
+
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as weather_app
+from fake_openweather import start_server
+from loadtest import summarize
+from weather_cache import current_cache
+
+weather_client = weather_app.weather_client
+
+
+def run(client, count, clear_cache=True, locations=1):
+    timings = []
+    statuses = Counter()
+    for i in range(count):
+        if clear_cache:
+            current_cache.clear()
+        start = time.perf_counter()
+        response = client.get(f"/weather?location=City{i % locations}&fields=temp")
+        timings.append(time.perf_counter() - start)
+        body = response.get_json()
+        statuses["stale" if body.get("stale") else response.status_code] += 1
+    return timings, statuses
+
+
+def report(label, timings, statuses):
+    stats = summarize(timings, 0, 1)
+    print(f"{label:<14} p50 {stats['p50_ms']:8.1f} ms   p95 {stats['p95_ms']:8.1f} ms   "
+          f"p99 {stats['p99_ms']:8.1f} ms   {dict(statuses)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.02, help="normal upstream latency in seconds")
+    parser.add_argument("--slow-rate", type=float, default=0.03,
+                        help="share of upstream calls that stall; hedging at p95 only helps below 0.05")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="seconds a stalled call takes")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    weather_client.WEATHER_URL = f"{base_url}/data/2.5/weather"
+    weather_client.FORECAST_URL = f"{base_url}/data/2.5/forecast"
+    weather_client.prefetcher.stop()
+    client = weather_app.app.test_client()
+
+    # Fill the latency window the hedge delay is taken from
+    run(client, 50)
+
+    weather_client.HEDGE_REQUESTS = False
+    report("no hedging", *run(client, args.requests))
+    weather_client.HEDGE_REQUESTS = True
+    report("hedged", *run(client, args.requests))
+    print(f"hedges sent: {dict((labels, value) for _, labels, value in weather_client.HEDGES.samples())}")
+
+    print("outage")
+    locations = 20
+    current_cache.clear()
+    current_cache.ttl = current_cache.stale_ttl = 0.001
+    run(client, locations, clear_cache=False, locations=locations)
+    time.sleep(0.01)
+    server.RequestHandlerClass.error_rate = 1.0
+    server.RequestHandlerClass.slow_rate = 0.0
+    report("upstream down", *run(client, args.requests, clear_cache=False, locations=locations))
+    print(f"breaker: {weather_client.breakers['weather'].state}")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
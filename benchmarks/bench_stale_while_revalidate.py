@@ -0,0 +1,106 @@
+"""Compare /weather tail latency with plain TTL expiry vs stale-while-revalidate plus prefetch.
+
+Runs app.py against the local fake OpenWeather server with short cache TTLs,
+so entries keep expiring during the run. Traffic is skewed: most requests go
+to a few popular locations, the rest are spread over a long tail. The
+baseline serves nothing past expiry and has the prefetch scheduler stopped.
+
+    python benchmarks/bench_stale_while_revalidate.py --latency 0.2 --ttl 2 --duration 10
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import app as weather_app
+from fake_openweather import start_server
+from loadtest import summarize
+from weather_cache import current_cache, forecast_cache
+
+prefetcher = weather_app.weather_client.prefetcher
+
+
+def run(client, args):
+    popular = [f"Popular{i}" for i in range(args.popular)]
+    tail = [f"Tail{i}" for i in range(args.tail)]
+    # Start with the popular locations cached so only expiry shows up in their tail
+    for city in popular:
+        client.post("/weather", json={"location": city, "units": "metric"})
+    deadline = time.perf_counter() + args.duration
+
+    def worker(seed):
+        rng = random.Random(seed)
+        timings = []
+        while time.perf_counter() < deadline:
+            city = rng.choice(popular) if rng.random() < 0.8 else rng.choice(tail)
+            start = time.perf_counter()
+            response = client.post("/weather", json={"location": city, "units": "metric"})
+            assert response.status_code == 200, response.get_json()
+            timings.append((city in popular, time.perf_counter() - start))
+            time.sleep(args.think)
+        return timings
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        timings = [t for result in pool.map(worker, range(args.concurrency)) for t in result]
+    elapsed = time.perf_counter() - start
+
+    hot = summarize([t for is_popular, t in timings if is_popular], 0, elapsed)
+    print(f"  popular  p50 {hot['p50_ms']:8.1f} ms   p99 {hot['p99_ms']:8.1f} ms   ({hot['requests']} requests)")
+    every = summarize([t for _, t in timings], 0, elapsed)
+    print(f"  all      p50 {every['p50_ms']:8.1f} ms   p99 {every['p99_ms']:8.1f} ms   ({every['requests']} requests)")
+    return hot
+
+
+def reset(ttl, stale_ttl):
+    for cache in (current_cache, forecast_cache):
+        cache.clear()
+        cache.ttl = ttl
+        cache.stale_ttl = stale_ttl
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="fake upstream latency in seconds")
+    parser.add_argument("--ttl", type=float, default=2.0, help="cache TTL in seconds")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--think", type=float, default=0.01, help="pause between a client's requests")
+    parser.add_argument("--popular", type=int, default=5, help="locations receiving 80%% of traffic")
+    parser.add_argument("--tail", type=int, default=200, help="locations sharing the other 20%%")
+    args = parser.parse_args()
+
+    server, base_url = start_server(latency=args.latency)
+    weather_app.weather_client.WEATHER_URL = f"{base_url}/data/2.5/weather"
+    weather_app.weather_client.FORECAST_URL = f"{base_url}/data/2.5/forecast"
+    weather_app.weather_client.ENDPOINTS.update({
+        'weather': (current_cache, weather_app.weather_client.WEATHER_URL),
+        'forecast': (forecast_cache, weather_app.weather_client.FORECAST_URL),
+    })
+    client = weather_app.app.test_client()
+
+    prefetcher.stop()
+    print("ttl only")
+    reset(args.ttl, 0)
+    baseline = run(client, args)
+
+    print("stale-while-revalidate + prefetch")
+    reset(args.ttl, args.ttl * 10)
+    prefetcher.interval = args.ttl / 4
+    prefetcher.lead = args.ttl / 2
+    prefetcher.budget = 60 * (2 * args.popular) / prefetcher.interval
+    prefetcher.start()
+    swr = run(client, args)
+    prefetcher.stop()
+
+    print(f"popular p99  {baseline['p99_ms'] / swr['p99_ms']:.1f}x lower")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Local stand-in for the OpenWeather API used by the benchmarks.
+
+Serves canned current weather, 5 day / 3 hour forecast, ZIP and reverse
+geocoding payloads with configurable latency and error injection, so the app
+can be measured without touching the real API or spending quota. Cities whose
+name starts with "nowhere" return OpenWeather's 404. With a quota set, requests
+beyond it within the trailing window are answered with 429 like the real plan.
+
+    python benchmarks/fake_openweather.py --port 8099 --latency 0.05 --error-rate 0.01
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+
+from collections import Counter, deque
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+
+def current_payload(name="Benchville", country="US", timezone_offset=0, lat=40.7128, lon=-74.006, city_id=5128581):
+    now = int(time.time())
+    return {
+        "coord": {"lon": lon, "lat": lat},
+        "weather": [{"id": 800, "main": "Clear", "description": "clear sky", "icon": "01d"}],
+        "main": {"temp": 21.5, "feels_like": 21.0, "temp_min": 19.2, "temp_max": 23.8,
+                 "pressure": 1015, "humidity": 52},
+        "visibility": 10000,
+        "wind": {"speed": 3.6, "deg": 200},
+        "clouds": {"all": 0},
+        "dt": now,
+        "sys": {"country": country, "sunrise": now - 6 * 3600, "sunset": now + 6 * 3600},
+        "timezone": timezone_offset,
+        "id": city_id,
+        "name": name,
+        "cod": 200,
+    }
+
+
+def forecast_payload(name="Benchville", country="US", timezone_offset=0, lat=40.7128, lon=-74.006, city_id=5128581):
+    # Align to the 3 hour grid OpenWeather uses, starting with the next slot
+    start = (int(time.time()) // 10800 + 1) * 10800
+    entries = []
+    for i in range(40):
+        dt = start + i * 10800
+        entries.append({
+            "dt": dt,
+            "main": {"temp": 15 + (i % 8), "feels_like": 14 + (i % 8), "temp_min": 14 + (i % 8),
+                     "temp_max": 16 + (i % 8), "pressure": 1012, "humidity": 60},
+            "weather": [{"id": 500, "main": "Rain", "description": "light rain", "icon": "10d"}],
+            "wind": {"speed": 4.12, "deg": 180},
+            "pop": 0.35,
+            "dt_txt": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(dt)),
+        })
+    return {
+        "cod": "200",
+        "cnt": len(entries),
+        "list": entries,
+        "city": {"id": city_id, "name": name, "country": country, "timezone": timezone_offset,
+                 "coord": {"lat": lat, "lon": lon}},
+    }
+
+
+class FakeOpenWeatherHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so clients can keep connections alive between requests
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    rate_limit_rate = 0.0
+    quota = 0
+    quota_window = 60.0
+    slow_rate = 0.0
+    slow_latency = 0.0
+    request_counts = None
+    accepted = None
+    quota_lock = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        endpoint = url.path.rsplit("/", 1)[-1]
+        self.request_counts[endpoint] += 1
+
+        if self.quota and self._over_quota():
+            self.request_counts["throttled"] += 1
+            return self._send(429, {"cod": 429, "message": "Your account is temporary blocked due to exceeding of requests limitation"})
+
+        # A slow_rate share of requests stalls for slow_latency, like a struggling upstream node
+        stall = self.slow_latency if random.random() < self.slow_rate else 0.0
+        time.sleep(self.latency + random.uniform(0, self.jitter) + stall)
+
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return self._send(429, {"cod": 429, "message": "Your account is temporary blocked due to exceeding of requests limitation"})
+        if roll < self.rate_limit_rate + self.error_rate:
+            return self._send(500, {"cod": "500", "message": "Internal error"})
+
+        name = query.get("q", "Benchville").split(",")[0]
+        if name.lower().startswith("nowhere"):
+            return self._send(404, {"cod": "404", "message": "city not found"})
+
+        # Each city name and ZIP code gets its own stable coordinates
+        seed = zlib.crc32((query.get("zip") or name).split(",")[0].strip().lower().encode())
+        lat = float(query.get("lat", seed % 12000 / 100 - 60))
+        lon = float(query.get("lon", seed // 12000 % 36000 / 100 - 180))
+        city_id = query.get("id") or zlib.crc32(f"{lat:.2f},{lon:.2f}".encode()) % 9000000 + 1000000
+        if endpoint == "weather":
+            self._send(200, current_payload(name, lat=lat, lon=lon, city_id=int(city_id)))
+        elif endpoint == "forecast":
+            self._send(200, forecast_payload(name, lat=lat, lon=lon, city_id=int(city_id)))
+        elif endpoint == "zip":
+            zip_code, _, country = query.get("zip", "10001").partition(",")
+            self._send(200, {"zip": zip_code, "name": "Benchville", "lat": lat, "lon": lon,
+                             "country": (country or "US").upper()})
+        elif endpoint == "reverse":
+            self._send(200, [{"name": "Benchville", "lat": lat, "lon": lon, "country": "US", "state": "New York"}])
+        else:
+            self._send(404, {"cod": "404", "message": "unknown endpoint"})
+
+    def _over_quota(self):
+        now = time.monotonic()
+        with self.quota_lock:
+            while self.accepted and self.accepted[0] <= now - self.quota_window:
+                self.accepted.popleft()
+            if len(self.accepted) >= self.quota:
+                return True
+            self.accepted.append(now)
+            return False
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(latency=0.0, port=0, jitter=0.0, error_rate=0.0, rate_limit_rate=0.0, quota=0, quota_window=60.0,
+                 slow_rate=0.0, slow_latency=0.0):
+    """Start the fake API on a background thread and return (server, base_url).
+
+    server.request_counts counts the requests received per endpoint, plus
+    "throttled" for requests rejected for exceeding quota per quota_window seconds.
+    """
+    handler = type("Handler", (FakeOpenWeatherHandler,), {
+        "latency": latency,
+        "jitter": jitter,
+        "error_rate": error_rate,
+        "rate_limit_rate": rate_limit_rate,
+        "quota": quota,
+        "quota_window": quota_window,
+        "slow_rate": slow_rate,
+        "slow_latency": slow_latency,
+        "request_counts": Counter(),
+        "accepted": deque(),
+        "quota_lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.request_counts = handler.request_counts
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, up to this many seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with 429")
+    parser.add_argument("--quota", type=int, default=0, help="requests per minute before answering 429")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests delayed by --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.latency, args.port, args.jitter, args.error_rate, args.rate_limit_rate,
+                                    args.quota, slow_rate=args.slow_rate, slow_latency=args.slow_latency)
+    print(f"Fake OpenWeather listening on {base_url} (set OPENWEATHER_API_BASE={base_url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
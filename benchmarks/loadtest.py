@@ -0,0 +1,261 @@
+"""Reproducible load test for /weather and the database.py CRUD paths.
+
+Starts the local fake OpenWeather server, points the app at it through
+OPENWEATHER_API_BASE and drives it at a fixed concurrency, first under
+Flask's threaded development server and then under gunicorn. The CRUD
+functions are driven against a scratch SQLite file. Latency percentiles and
+throughput are written as JSON; pass an earlier run with --compare to fail on
+regressions.
+
+    python benchmarks/loadtest.py --targets flask,gunicorn,database --output results.json
+    python benchmarks/loadtest.py --compare results.json --max-regression 0.2
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import requests
+
+from fake_openweather import start_server
+
+WEATHER = {
+    'temp': 21.5, 'temp_min': 18.0, 'temp_max': 24.1, 'feels_like': 21.0,
+    'description': 'clear sky', 'local_time': 'Mon, Jan 01 03:00 PM', 'weather_icon': '01d',
+}
+
+
+def summarize(timings, errors, elapsed):
+    timings = sorted(timings)
+
+    def percentile(p):
+        if not timings:
+            return None
+        return round(timings[min(len(timings) - 1, int(len(timings) * p))] * 1000, 3)
+
+    return {
+        "requests": len(timings) + errors,
+        "errors": errors,
+        "throughput_rps": round((len(timings) + errors) / elapsed, 1) if elapsed else None,
+        "mean_ms": round(sum(timings) / len(timings) * 1000, 3) if timings else None,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+
+
+def drive_http(base_url, args):
+    """POST /weather from args.concurrency threads, each with its own keep-alive session"""
+    local = threading.local()
+    cities = [f"City{i}" for i in range(args.locations)]
+
+    def one(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        city = random.Random(args.seed + i).choice(cities)
+
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{base_url}/weather", json={"location": city, "units": "metric"}, timeout=30)
+            ok = response.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        outcomes = list(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    return summarize([t for t, ok in outcomes if ok], sum(1 for _, ok in outcomes if not ok), elapsed)
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(("127.0.0.1", port)) == 0:
+                return
+        time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_flask(args):
+    from werkzeug.serving import make_server
+    import app as weather_app
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = make_server("127.0.0.1", 0, weather_app.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        return drive_http(f"http://127.0.0.1:{server.server_port}", args)
+    finally:
+        server.shutdown()
+
+
+def run_gunicorn(args):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "app:app", "--workers", str(args.workers),
+         "--bind", f"127.0.0.1:{port}", "--log-level", "warning"],
+        cwd=ROOT, env=os.environ.copy(),
+    )
+    try:
+        wait_for_port(port)
+        return drive_http(f"http://127.0.0.1:{port}", args)
+    finally:
+        process.terminate()
+        process.wait(timeout=15)
+
+
+def run_database(args):
+    import database
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_NAME = os.path.join(tmp, "loadtest.db")
+        database.init_database()
+
+        def timed_ops(name, fn, count):
+            def one(i):
+                start = time.perf_counter()
+                try:
+                    fn(i)
+                    ok = True
+                except Exception:
+                    ok = False
+                return time.perf_counter() - start, ok
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                outcomes = list(pool.map(one, range(count)))
+            elapsed = time.perf_counter() - start
+            results[name] = summarize([t for t, ok in outcomes if ok], sum(1 for _, ok in outcomes if not ok), elapsed)
+
+        count = args.requests
+        ids = database.create_weather_records([{
+            'label': f"Seed {i}", 'location_type': 'city', 'location': f"City{i % args.locations}",
+            'start_date': '2024-01-01', 'end_date': '2024-01-01', 'weather_data': WEATHER,
+        } for i in range(count)])
+
+        timed_ops("db_create", lambda i: database.create_weather_record(
+            f"Trip {i}", 'city', f"City{i % args.locations}", '2024-01-02', '2024-01-02', WEATHER), count)
+        timed_ops("db_get_by_id", lambda i: database.get_record_by_id(ids[i]), count)
+        timed_ops("db_query_page", lambda i: database.query_records(limit=20, location=f"City{i % args.locations}"), count)
+        timed_ops("db_update_label", lambda i: database.update_record_label(ids[i], f"Renamed {i}"), count)
+        timed_ops("db_delete", lambda i: database.delete_record(ids[i]), count)
+
+    return results
+
+
+def compare(results, baseline_path, max_regression):
+    """Print p95/throughput changes against a previous run, returns the regressed scenario names"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or not before.get("p95_ms") or not current.get("p95_ms"):
+            continue
+
+        p95_change = current["p95_ms"] / before["p95_ms"] - 1
+        rps_change = current["throughput_rps"] / before["throughput_rps"] - 1
+        flag = ""
+        if p95_change > max_regression or rps_change < -max_regression:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<16} p95 {p95_change:+7.1%}   throughput {rps_change:+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--targets", default="flask,database", help="comma separated: flask, gunicorn, database")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000, help="requests (or operations) per scenario")
+    parser.add_argument("--locations", type=int, default=200, help="distinct cities requested")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers")
+    parser.add_argument("--latency", type=float, default=0.05, help="fake upstream latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random upstream latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream calls that return 500")
+    parser.add_argument("--no-cache", action="store_true", help="expire cached responses immediately")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="results JSON from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    fake, base_url = start_server(args.latency, jitter=args.jitter, error_rate=args.error_rate)
+    # Read by app.py and weather_client.py at import, and inherited by gunicorn
+    os.environ["OPENWEATHER_API_BASE"] = base_url
+    os.environ["OPENWEATHER_API_KEY"] = "loadtest"
+    os.environ["PERSISTENT_CACHE"] = "0"
+    if args.no_cache:
+        os.environ["CURRENT_CACHE_TTL"] = os.environ["FORECAST_CACHE_TTL"] = "0"
+        os.environ["CACHE_STALE_TTL"] = "0"
+
+    results = {}
+    targets = [target.strip() for target in args.targets.split(",") if target.strip()]
+    for target in targets:
+        print(f"Running {target}...")
+        if target == "flask":
+            results["flask_weather"] = run_flask(args)
+        elif target == "gunicorn":
+            results["gunicorn_weather"] = run_gunicorn(args)
+        elif target == "database":
+            results.update(run_database(args))
+        else:
+            parser.error(f"unknown target {target}")
+    fake.shutdown()
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = None
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": commit or None,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    for name, stats in results.items():
+        print(f"{name:<16} {stats['throughput_rps']:>8} req/s   p50 {stats['p50_ms']} ms   "
+              f"p95 {stats['p95_ms']} ms   p99 {stats['p99_ms']} ms   errors {stats['errors']}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare and compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
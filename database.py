@@ -1,12 +1,56 @@
+import os
 import sqlite3
+import threading
+import time
 from datetime import datetime
 
 DATABASE_NAME = 'weather_queries.db'
 
+# Raw upstream payloads live in their own file so cache churn never locks the records table
+CACHE_DATABASE_NAME = os.getenv('WEATHER_CACHE_DB', 'weather_cache.db')
+
+# Per-connection tuning; NORMAL sync is durable across app crashes in WAL mode, only an OS crash can lose the last commits
+SQLITE_CACHE_SIZE_KB = int(os.getenv('SQLITE_CACHE_SIZE_KB', '8192'))
+SQLITE_MMAP_SIZE = int(os.getenv('SQLITE_MMAP_SIZE', str(64 * 1024 * 1024)))
+STATEMENT_CACHE_SIZE = 256
+
+# Connections are opened once per thread and database file, then reused
+_local = threading.local()
+
+def _connect(path):
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=5, cached_statements=STATEMENT_CACHE_SIZE)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size={SQLITE_MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        connections[path] = conn
+    return conn
+
+def close_connections():
+    """Close this thread's database connections"""
+    for conn in getattr(_local, 'connections', {}).values():
+        conn.close()
+    _local.connections = {}
+
 def init_database():
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    
+    conn = get_connection()
+
+    try:
+        _create_tables(conn.cursor())
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    print("Database initialized successfully!")
+
+def _create_tables(cursor):
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS weather_records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -23,51 +67,323 @@ def init_database():
             local_time TEXT,
             weather_icon TEXT,
             created_at TEXT NOT NULL,
-            updated_at TEXT NOT NULL
+            updated_at TEXT NOT NULL,
+            location_id INTEGER,
+            change_seq INTEGER NOT NULL DEFAULT 0
         )
     ''')
-    
-    conn.commit()
-    conn.close()
-    print("Database initialized successfully!")
+
+    # Databases created before location_id existed get the column; their old records stay NULL until linked
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(weather_records)')]
+    if 'location_id' not in columns:
+        cursor.execute('ALTER TABLE weather_records ADD COLUMN location_id INTEGER')
+    # Older records are numbered in the (updated_at, id) order incremental exports used before change_seq
+    if 'change_seq' not in columns:
+        cursor.execute('ALTER TABLE weather_records ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0')
+        cursor.execute('''
+            UPDATE weather_records SET change_seq = ranked.seq
+            FROM (SELECT id, ROW_NUMBER() OVER (ORDER BY updated_at, id) AS seq FROM weather_records) AS ranked
+            WHERE ranked.id = weather_records.id
+        ''')
+
+    # Single-row counter behind change_seq, bumped inside every transaction that writes weather_records
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            seq INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('''
+        INSERT OR IGNORE INTO change_counter (id, seq)
+        SELECT 1, COALESCE(MAX(change_seq), 0) FROM weather_records
+    ''')
+
+    # Listing is newest-first and filters on location and date, so keep those off full-table scans
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weather_records_created_at ON weather_records (created_at, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weather_records_location ON weather_records (location, start_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weather_records_start_date ON weather_records (start_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weather_records_change_seq ON weather_records (change_seq, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weather_records_location_id ON weather_records (location_id, start_date)')
+
+    _init_location_stats(cursor)
+
+    # Canonical place for every city, ZIP and lat/lon the CLI has resolved, keyed like the upstream cache
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS geocodes (
+            id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            query TEXT NOT NULL,
+            name TEXT NOT NULL,
+            country TEXT,
+            lat REAL NOT NULL,
+            lon REAL NOT NULL,
+            resolved_at TEXT NOT NULL,
+            UNIQUE (kind, query)
+        )
+    ''')
+
+    # Every 3-hourly forecast point per geocoded location; clustered on (location_id, ts) for range scans
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_points (
+            location_id INTEGER NOT NULL,
+            ts INTEGER NOT NULL,
+            utc_offset INTEGER NOT NULL,
+            temp REAL,
+            feels_like REAL,
+            temp_min REAL,
+            temp_max REAL,
+            pressure INTEGER,
+            humidity INTEGER,
+            wind_speed REAL,
+            wind_deg INTEGER,
+            clouds INTEGER,
+            pop REAL,
+            condition_id INTEGER,
+            PRIMARY KEY (location_id, ts)
+        ) WITHOUT ROWID
+    ''')
+
+    # Distinct (description, icon) pairs, so forecast_points stays numeric
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS forecast_conditions (
+            id INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            icon TEXT NOT NULL,
+            UNIQUE (description, icon)
+        )
+    ''')
+
+    # Rows of bulk import files already stored, so an interrupted import resumes where it stopped
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_rows (
+            source TEXT NOT NULL,
+            line INTEGER NOT NULL,
+            PRIMARY KEY (source, line)
+        ) WITHOUT ROWID
+    ''')
+
+    # High-water marks for incremental exports, one row per export name
+    watermark_columns = [row[1] for row in cursor.execute('PRAGMA table_info(export_watermarks)')]
+    if 'last_id' in watermark_columns:
+        cursor.execute('ALTER TABLE export_watermarks RENAME TO export_watermarks_old')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS export_watermarks (
+            name TEXT PRIMARY KEY,
+            change_seq INTEGER NOT NULL,
+            exported_at TEXT NOT NULL
+        )
+    ''')
+    # Marks saved as (updated_at, id) become the change_seq of the last record they covered
+    if 'last_id' in watermark_columns:
+        cursor.execute('''
+            INSERT INTO export_watermarks (name, change_seq, exported_at)
+            SELECT name, COALESCE((
+                SELECT MAX(change_seq) FROM weather_records
+                WHERE (weather_records.updated_at, weather_records.id) <= (old.updated_at, old.last_id)
+            ), 0), exported_at
+            FROM export_watermarks_old AS old
+        ''')
+        cursor.execute('DROP TABLE export_watermarks_old')
+    cursor.execute('DROP INDEX IF EXISTS idx_weather_records_updated_at')
+
+def _init_location_stats(cursor):
+    """Per-location, per-day temperature aggregates of weather_records, kept current by triggers.
+
+    Inserts and deletes adjust one row each. Removing the record that held a
+    day's min or max re-reads only that location's records for that day,
+    through idx_weather_records_location_id.
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS location_daily_stats (
+            location_id INTEGER NOT NULL,
+            day TEXT NOT NULL,
+            records INTEGER NOT NULL,
+            temp_sum REAL NOT NULL,
+            temp_count INTEGER NOT NULL,
+            temp_min REAL,
+            temp_max REAL,
+            PRIMARY KEY (location_id, day)
+        ) WITHOUT ROWID
+    ''')
+
+    add = '''
+        INSERT INTO location_daily_stats (location_id, day, records, temp_sum, temp_count, temp_min, temp_max)
+        SELECT NEW.location_id, NEW.start_date, 1, COALESCE(NEW.temp, 0), NEW.temp IS NOT NULL,
+               NEW.temp_min, NEW.temp_max
+        WHERE NEW.location_id IS NOT NULL
+        ON CONFLICT (location_id, day) DO UPDATE SET
+            records = records + 1,
+            temp_sum = temp_sum + excluded.temp_sum,
+            temp_count = temp_count + excluded.temp_count,
+            temp_min = MIN(COALESCE(temp_min, excluded.temp_min), COALESCE(excluded.temp_min, temp_min)),
+            temp_max = MAX(COALESCE(temp_max, excluded.temp_max), COALESCE(excluded.temp_max, temp_max));
+    '''
+    remove = '''
+        UPDATE location_daily_stats SET
+            records = records - 1,
+            temp_sum = temp_sum - COALESCE(OLD.temp, 0),
+            temp_count = temp_count - (OLD.temp IS NOT NULL),
+            temp_min = CASE WHEN OLD.temp_min <= temp_min THEN (
+                SELECT MIN(temp_min) FROM weather_records
+                WHERE location_id = OLD.location_id AND start_date = OLD.start_date
+            ) ELSE temp_min END,
+            temp_max = CASE WHEN OLD.temp_max >= temp_max THEN (
+                SELECT MAX(temp_max) FROM weather_records
+                WHERE location_id = OLD.location_id AND start_date = OLD.start_date
+            ) ELSE temp_max END
+        WHERE location_id = OLD.location_id AND day = OLD.start_date;
+        DELETE FROM location_daily_stats
+        WHERE location_id = OLD.location_id AND day = OLD.start_date AND records <= 0;
+    '''
+
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS weather_records_stats_insert AFTER INSERT ON weather_records
+        BEGIN {add} END
+    ''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS weather_records_stats_delete AFTER DELETE ON weather_records
+        BEGIN {remove} END
+    ''')
+    # Label edits don't touch the aggregates
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS weather_records_stats_update
+        AFTER UPDATE OF location_id, start_date, temp, temp_min, temp_max ON weather_records
+        BEGIN {remove} {add} END
+    ''')
+
+    # Fill the table for records linked before it existed
+    if not cursor.execute('SELECT 1 FROM location_daily_stats LIMIT 1').fetchone():
+        rebuild_location_stats(cursor)
+
+def rebuild_location_stats(cursor=None):
+    """Recompute location_daily_stats from every linked record"""
+    conn = get_connection()
+    own_transaction = cursor is None
+    cursor = cursor or conn.cursor()
+
+    try:
+        cursor.execute('DELETE FROM location_daily_stats')
+        cursor.execute('''
+            INSERT INTO location_daily_stats (location_id, day, records, temp_sum, temp_count, temp_min, temp_max)
+            SELECT location_id, start_date, COUNT(*), COALESCE(SUM(temp), 0), COUNT(temp), MIN(temp_min), MAX(temp_max)
+            FROM weather_records
+            WHERE location_id IS NOT NULL
+            GROUP BY location_id, start_date
+        ''')
+    except sqlite3.Error:
+        # The caller owns a transaction it was handed and rolls it back itself
+        if own_transaction:
+            conn.rollback()
+        raise
+
+    if own_transaction:
+        conn.commit()
 
 def get_connection():
-    return sqlite3.connect(DATABASE_NAME)
+    return _connect(DATABASE_NAME)
+
+def _next_change_seq(cursor):
+    """Bump the change counter and return it; the bump takes the write lock, so values follow commit order"""
+    cursor.execute('UPDATE change_counter SET seq = seq + 1')
+    return cursor.execute('SELECT seq FROM change_counter').fetchone()[0]
 
-def create_weather_record(label, location_type, location, start_date, end_date, weather_data):
+def create_weather_record(label, location_type, location, start_date, end_date, weather_data, location_id=None):
     conn = get_connection()
     cursor = conn.cursor()
+
+    with conn:
+        current_time = datetime.now().isoformat()
+        change_seq = _next_change_seq(cursor)
+
+        cursor.execute('''
+            INSERT INTO weather_records 
+            (label, location_type, location, start_date, end_date, temp, temp_min, temp_max, 
+             feels_like, description, local_time, weather_icon, created_at, updated_at, location_id, change_seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            label,
+            location_type,
+            location,
+            start_date,
+            end_date,
+            weather_data.get('temp'),
+            weather_data.get('temp_min'),
+            weather_data.get('temp_max'),
+            weather_data.get('feels_like'),
+            weather_data.get('description'),
+            weather_data.get('local_time'),
+            weather_data.get('weather_icon'),
+            current_time,
+            current_time,
+            location_id,
+            change_seq
+        ))
+
+        record_id = cursor.lastrowid
     
+    return record_id
+
+def create_weather_records(records, imported=None):
+    """Insert many records in a single transaction and return their new IDs in order.
+
+    Each record is a dict with the same keys as create_weather_record's arguments
+    (location_id may be left out). imported is an optional (source, line numbers) pair marked done in
+    import_rows in the same transaction, so a resumed import never stores a row twice.
+    """
+    if not records:
+        return []
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
     current_time = datetime.now().isoformat()
-    
-    cursor.execute('''
-        INSERT INTO weather_records 
-        (label, location_type, location, start_date, end_date, temp, temp_min, temp_max, 
-         feels_like, description, local_time, weather_icon, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (
-        label,
-        location_type,
-        location,
-        start_date,
-        end_date,
-        weather_data.get('temp'),
-        weather_data.get('temp_min'),
-        weather_data.get('temp_max'),
-        weather_data.get('feels_like'),
-        weather_data.get('description'),
-        weather_data.get('local_time'),
-        weather_data.get('weather_icon'),
+
+    try:
+        change_seq = _next_change_seq(cursor)
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    rows = [(
+        record['label'],
+        record['location_type'],
+        record['location'],
+        record['start_date'],
+        record['end_date'],
+        record['weather_data'].get('temp'),
+        record['weather_data'].get('temp_min'),
+        record['weather_data'].get('temp_max'),
+        record['weather_data'].get('feels_like'),
+        record['weather_data'].get('description'),
+        record['weather_data'].get('local_time'),
+        record['weather_data'].get('weather_icon'),
+        current_time,
         current_time,
-        current_time
-    ))
+        record.get('location_id'),
+        change_seq
+    ) for record in records]
 
-    record_id = cursor.lastrowid
-    
-    conn.commit()
-    conn.close()
-    
-    return record_id
+    try:
+        cursor.executemany('''
+            INSERT INTO weather_records
+            (label, location_type, location, start_date, end_date, temp, temp_min, temp_max,
+             feels_like, description, local_time, weather_icon, created_at, updated_at, location_id, change_seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+
+        # The transaction holds the write lock, so AUTOINCREMENT hands out consecutive IDs
+        last_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+
+        if imported:
+            source, lines = imported
+            cursor.executemany('INSERT OR IGNORE INTO import_rows (source, line) VALUES (?, ?)',
+                               [(source, line) for line in lines])
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+
+    return list(range(last_id - len(rows) + 1, last_id + 1))
 
 def read_all_records():
     conn = get_connection()
@@ -82,7 +398,6 @@ def read_all_records():
     ''')
     
     records = cursor.fetchall()
-    conn.close()
     
     # Convert to list of dictionaries for easier handling
     columns = ['id', 'label', 'location_type', 'location', 'start_date', 'end_date',
@@ -91,36 +406,246 @@ def read_all_records():
     
     return [dict(zip(columns, record)) for record in records]
 
-def update_record_label(record_id, new_label):
+def _record_filters(location=None, start_from=None, start_to=None, label=None):
+    conditions = []
+    params = []
+
+    if location:
+        conditions.append('location = ?')
+        params.append(location)
+    if start_from:
+        conditions.append('start_date >= ?')
+        params.append(start_from)
+    if start_to:
+        conditions.append('start_date <= ?')
+        params.append(start_to)
+    if label:
+        conditions.append("label LIKE ? ESCAPE '\\'")
+        escaped = label.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        params.append(f"%{escaped}%")
+
+    return conditions, params
+
+def query_records(limit=20, after=None, location=None, start_from=None, start_to=None, label=None):
+    """Get one page of records, newest first, returns (records, next_cursor).
+
+    Pass next_cursor back as after to get the following page; it is None on the
+    last page. location matches exactly, start_from/start_to bound start_date
+    (YYYY-MM-DD, inclusive) and label matches any part of the label.
+    """
+    conditions, params = _record_filters(location, start_from, start_to, label)
+
+    # Keyset pagination: seek past the last row of the previous page instead of using OFFSET
+    if after:
+        conditions.append('(created_at, id) < (?, ?)')
+        params.extend(after)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
     conn = get_connection()
     cursor = conn.cursor()
-    
-    current_time = datetime.now().isoformat()
-    
+
+    cursor.execute(f'''
+        SELECT id, label, location_type, location, start_date, end_date,
+               temp, temp_min, temp_max, feels_like, description,
+               local_time, weather_icon, created_at, updated_at
+        FROM weather_records
+        {where}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    ''', params + [limit + 1])
+
+    rows = cursor.fetchall()
+
+    columns = ['id', 'label', 'location_type', 'location', 'start_date', 'end_date',
+              'temp', 'temp_min', 'temp_max', 'feels_like', 'description',
+              'local_time', 'weather_icon', 'created_at', 'updated_at']
+    records = [dict(zip(columns, row)) for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        next_cursor = (records[-1]['created_at'], records[-1]['id'])
+
+    return records, next_cursor
+
+def count_records(location=None, start_from=None, start_to=None, label=None):
+    conditions, params = _record_filters(location, start_from, start_to, label)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(f'SELECT COUNT(*) FROM weather_records {where}', params)
+    return cursor.fetchone()[0]
+
+def iter_records(chunk_size=500):
+    """Yield every record as a dict, newest first, holding only chunk_size rows in memory"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
     cursor.execute('''
-        UPDATE weather_records 
-        SET label = ?, updated_at = ?
-        WHERE id = ?
-    ''', (new_label, current_time, record_id))
-    
-    rows_affected = cursor.rowcount
-    conn.commit()
-    conn.close()
+        SELECT id, label, location_type, location, start_date, end_date,
+               temp, temp_min, temp_max, feels_like, description,
+               local_time, weather_icon, created_at, updated_at
+        FROM weather_records
+        ORDER BY created_at DESC, id DESC
+    ''')
+
+    columns = [column[0] for column in cursor.description]
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            yield dict(zip(columns, row))
+
+def iter_records_since(watermark=None, chunk_size=500):
+    """Yield records changed after watermark, oldest change first.
+
+    watermark is the change_seq stored by set_export_watermark; None yields
+    every record. A transaction's changes share one change_seq and commit
+    together, so a single query never sees only part of one. Deleted records
+    are not reported.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    where = 'WHERE change_seq > ?' if watermark is not None else ''
+    cursor.execute(f'''
+        SELECT id, label, location_type, location, start_date, end_date,
+               temp, temp_min, temp_max, feels_like, description,
+               local_time, weather_icon, created_at, updated_at, change_seq
+        FROM weather_records
+        {where}
+        ORDER BY change_seq, id
+    ''', () if watermark is None else (watermark,))
+
+    columns = [column[0] for column in cursor.description]
+
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            yield dict(zip(columns, row))
+
+def get_export_watermark(name):
+    """Get the change_seq high-water mark of the last export with this name, or None"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT change_seq FROM export_watermarks WHERE name = ?', (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+def set_export_watermark(name, change_seq):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    with conn:
+        cursor.execute('''
+            INSERT OR REPLACE INTO export_watermarks (name, change_seq, exported_at)
+            VALUES (?, ?, ?)
+        ''', (name, change_seq, datetime.now().isoformat()))
+
+def update_record_label(record_id, new_label):
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    with conn:
+        current_time = datetime.now().isoformat()
+        change_seq = _next_change_seq(cursor)
+
+        cursor.execute('''
+            UPDATE weather_records 
+            SET label = ?, updated_at = ?, change_seq = ?
+            WHERE id = ?
+        ''', (new_label, current_time, change_seq, record_id))
+
+        rows_affected = cursor.rowcount
     
     return rows_affected > 0
 
 def delete_record(record_id):
     conn = get_connection()
     cursor = conn.cursor()
-    
-    cursor.execute('DELETE FROM weather_records WHERE id = ?', (record_id,))
-    
-    rows_affected = cursor.rowcount
-    conn.commit()
-    conn.close()
+
+    with conn:
+        cursor.execute('DELETE FROM weather_records WHERE id = ?', (record_id,))
+
+        rows_affected = cursor.rowcount
     
     return rows_affected > 0
 
+def unlinked_locations():
+    """Distinct (location_type, location) pairs of records without a location_id"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT DISTINCT location_type, location FROM weather_records
+        WHERE location_id IS NULL
+    ''')
+    return cursor.fetchall()
+
+def link_location(location_type, location, location_id):
+    """Set location_id on the unlinked records for a location, returns how many were updated"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    with conn:
+        # A newly linked record changed, so incremental exports pick it up again
+        cursor.execute('''
+            UPDATE weather_records SET location_id = ?, updated_at = ?, change_seq = ?
+            WHERE location_type = ? AND location = ? AND location_id IS NULL
+        ''', (location_id, datetime.now().isoformat(), _next_change_seq(cursor), location_type, location))
+
+        rows_affected = cursor.rowcount
+
+    return rows_affected
+
+def query_location_stats(period='day', location_id=None, start_from=None, start_to=None):
+    """Temperature summary per location per day or week (weeks start on Monday), from location_daily_stats.
+
+    Returns dicts with location_id, name, period (the day or the week's
+    Monday, YYYY-MM-DD), records, avg_temp, min_temp and max_temp, ordered
+    by name then period. start_from/start_to bound the day (inclusive). The
+    cost depends on the number of locations and days, not on how many
+    records there are.
+    """
+    conditions = []
+    params = []
+
+    if location_id is not None:
+        conditions.append('s.location_id = ?')
+        params.append(location_id)
+    if start_from:
+        conditions.append('s.day >= ?')
+        params.append(start_from)
+    if start_to:
+        conditions.append('s.day <= ?')
+        params.append(start_to)
+
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    bucket = "date(s.day, '-6 days', 'weekday 1')" if period == 'week' else 's.day'
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute(f'''
+        SELECT s.location_id, g.name, g.country, {bucket} AS period, SUM(s.records),
+               SUM(s.temp_sum) / NULLIF(SUM(s.temp_count), 0), MIN(s.temp_min), MAX(s.temp_max)
+        FROM location_daily_stats s
+        LEFT JOIN geocodes g ON g.id = s.location_id
+        {where}
+        GROUP BY s.location_id, period
+        ORDER BY g.name, s.location_id, period
+    ''', params)
+
+    columns = ['location_id', 'name', 'country', 'period', 'records', 'avg_temp', 'min_temp', 'max_temp']
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
 def get_record_by_id(record_id):
     """Get a specific record by ID"""
     conn = get_connection()
@@ -135,7 +660,6 @@ def get_record_by_id(record_id):
     ''', (record_id,))
     
     record = cursor.fetchone()
-    conn.close()
     
     if record:
         columns = ['id', 'label', 'location_type', 'location', 'start_date', 'end_date',
@@ -145,5 +669,183 @@ def get_record_by_id(record_id):
     
     return None
 
+def mark_lines_imported(source, lines):
+    """Mark import file lines done without storing records for them"""
+    if not lines:
+        return
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    with conn:
+        cursor.executemany('INSERT OR IGNORE INTO import_rows (source, line) VALUES (?, ?)',
+                           [(source, line) for line in lines])
+
+def get_imported_lines(source):
+    """Line numbers of an import file whose records are already stored"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT line FROM import_rows WHERE source = ?', (source,))
+    return {row[0] for row in cursor.fetchall()}
+
+def get_geocode(kind, query):
+    """Get the place a normalized location query resolved to, as a dict, or None"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT id, name, country, lat, lon FROM geocodes
+        WHERE kind = ? AND query = ?
+    ''', (kind, query))
+
+    row = cursor.fetchone()
+    if row:
+        return dict(zip(['id', 'name', 'country', 'lat', 'lon'], row))
+    return None
+
+def save_geocode(kind, query, name, country, lat, lon):
+    """Store (or refresh) the place a location query resolved to, returns its ID"""
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    with conn:
+        cursor.execute('''
+            INSERT INTO geocodes (kind, query, name, country, lat, lon, resolved_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (kind, query) DO UPDATE SET
+                name = excluded.name, country = excluded.country,
+                lat = excluded.lat, lon = excluded.lon, resolved_at = excluded.resolved_at
+        ''', (kind, query, name, country, lat, lon, datetime.now().isoformat()))
+
+        geocode_id = cursor.execute('SELECT id FROM geocodes WHERE kind = ? AND query = ?', (kind, query)).fetchone()[0]
+
+    return geocode_id
+
+# (description, icon) -> forecast_conditions.id, per database file
+_condition_ids = {}
+
+def _condition_id(cursor, description, icon):
+    key = (DATABASE_NAME, description, icon)
+    condition_id = _condition_ids.get(key)
+    if condition_id is None:
+        cursor.execute('INSERT OR IGNORE INTO forecast_conditions (description, icon) VALUES (?, ?)',
+                       (description, icon))
+        condition_id = cursor.execute('SELECT id FROM forecast_conditions WHERE description = ? AND icon = ?',
+                                      (description, icon)).fetchone()[0]
+        _condition_ids[key] = condition_id
+    return condition_id
+
+def store_forecast_points(location_id, points):
+    """Insert or refresh forecast points for a location in a single transaction.
+
+    Each point is a tuple of (ts, utc_offset, temp, feels_like, temp_min,
+    temp_max, pressure, humidity, wind_speed, wind_deg, clouds, pop,
+    description, icon), as built by forecast_engine.series_points. A newer
+    forecast for the same ts replaces the older one.
+    """
+    if not points:
+        return
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    try:
+        rows = [(location_id,) + point[:12] + (_condition_id(cursor, point[12], point[13]),) for point in points]
+        cursor.executemany('''
+            INSERT OR REPLACE INTO forecast_points
+            (location_id, ts, utc_offset, temp, feels_like, temp_min, temp_max, pressure, humidity,
+             wind_speed, wind_deg, clouds, pop, condition_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        # Condition ids looked up in the rolled back transaction may not exist
+        _condition_ids.clear()
+        raise
+
+def query_forecast_points(location_id, start_ts, end_ts):
+    """Get a location's forecast points with start_ts <= ts <= end_ts (UTC epoch seconds), oldest first.
+
+    Rows are tuples in store_forecast_points order, with the condition's
+    description and icon in place of its id.
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT p.ts, p.utc_offset, p.temp, p.feels_like, p.temp_min, p.temp_max, p.pressure, p.humidity,
+               p.wind_speed, p.wind_deg, p.clouds, p.pop, c.description, c.icon
+        FROM forecast_points p
+        LEFT JOIN forecast_conditions c ON c.id = p.condition_id
+        WHERE p.location_id = ? AND p.ts BETWEEN ? AND ?
+        ORDER BY p.ts
+    ''', (location_id, start_ts, end_ts))
+
+    return cursor.fetchall()
+
+def get_cache_connection():
+    # WAL lets every gunicorn worker and the CLI read while one of them writes
+    return _connect(CACHE_DATABASE_NAME)
+
+def init_cache_database():
+    conn = get_cache_connection()
+    cursor = conn.cursor()
+
+    with conn:
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS upstream_cache (
+                endpoint TEXT NOT NULL,
+                cache_key TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (endpoint, cache_key)
+            )
+        ''')
+
+def cache_get(endpoint, cache_key):
+    """Get an unexpired cached payload, returns (payload, expires_at) or None"""
+    conn = get_cache_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        SELECT payload, expires_at FROM upstream_cache
+        WHERE endpoint = ? AND cache_key = ? AND expires_at > ?
+    ''', (endpoint, cache_key, time.time()))
+
+    row = cursor.fetchone()
+
+    return row
+
+def cache_put(endpoint, cache_key, payload, expires_at):
+    conn = get_cache_connection()
+    cursor = conn.cursor()
+
+    with conn:
+        cursor.execute('''
+            INSERT OR REPLACE INTO upstream_cache (endpoint, cache_key, payload, expires_at)
+            VALUES (?, ?, ?, ?)
+        ''', (endpoint, cache_key, payload, expires_at))
+
+def cache_load(endpoint, limit):
+    """Get the freshest unexpired payloads for an endpoint, used to warm-start a worker"""
+    conn = get_cache_connection()
+    cursor = conn.cursor()
+
+    with conn:
+        now = time.time()
+        cursor.execute('DELETE FROM upstream_cache WHERE expires_at <= ?', (now,))
+        cursor.execute('''
+            SELECT cache_key, payload, expires_at FROM upstream_cache
+            WHERE endpoint = ?
+            ORDER BY expires_at DESC
+            LIMIT ?
+        ''', (endpoint, limit))
+
+        rows = cursor.fetchall()
+
+    return rows
+
 if __name__ == "__main__":
     init_database()
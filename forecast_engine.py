@@ -0,0 +1,151 @@
+"""Vectorized daily aggregation of OpenWeather 5 day / 3 hour forecasts.
+
+Payloads are flattened once into NumPy columns (one row per 3-hourly entry),
+then grouped by location and city-local day with array operations instead of
+per-entry datetime conversions. Several payloads can be aggregated in one pass.
+"""
+import time
+
+import numpy as np
+
+SECONDS_PER_DAY = 86400
+
+
+def forecast_columns(payloads):
+    """Flatten one forecast payload, or a list of them, into NumPy columns.
+
+    'location' holds the index of the payload each row came from; 'day' and
+    'minute' are the local day number (days since epoch) and minute of day,
+    using each payload's city.timezone offset.
+    """
+    if isinstance(payloads, dict):
+        payloads = [payloads]
+
+    # One pass over every entry of every payload, then one array per column
+    columns = location, dt, offset, temp, feels_like, wind_speed, pop, description, icon = [[] for _ in range(9)]
+    for index, payload in enumerate(payloads):
+        timezone_offset = payload.get('city', {}).get('timezone', 0)
+        for entry in payload['list']:
+            main = entry['main']
+            condition = entry['weather'][0]
+            location.append(index)
+            dt.append(entry['dt'])
+            offset.append(timezone_offset)
+            temp.append(main['temp'])
+            feels_like.append(main['feels_like'])
+            wind_speed.append(entry['wind']['speed'])
+            pop.append(entry.get('pop', 0))
+            description.append(condition['description'])
+            icon.append(condition['icon'])
+    return _columns(*columns)
+
+
+def _columns(location, dt, offset, temp, feels_like, wind_speed, pop, description, icon):
+    dt = np.array(dt, dtype=np.int64)
+    offset = np.array(offset, dtype=np.int64)
+    local = dt + offset
+
+    return {
+        'location': np.array(location, dtype=np.int64),
+        'dt': dt,
+        'offset': offset,
+        'day': local // SECONDS_PER_DAY,
+        'minute': local % SECONDS_PER_DAY // 60,
+        'temp': np.array(temp, dtype=np.float64),
+        'feels_like': np.array(feels_like, dtype=np.float64),
+        'wind_speed': np.array(wind_speed, dtype=np.float64),
+        'pop': np.array(pop, dtype=np.float64),
+        'description': np.array(description, dtype=object),
+        'icon': np.array(icon, dtype=object),
+    }
+
+
+def series_points(payload):
+    """Flatten a forecast payload into rows for database.store_forecast_points"""
+    offset = payload.get('city', {}).get('timezone', 0)
+    return [(
+        entry['dt'],
+        offset,
+        entry['main']['temp'],
+        entry['main']['feels_like'],
+        entry['main'].get('temp_min'),
+        entry['main'].get('temp_max'),
+        entry['main'].get('pressure'),
+        entry['main'].get('humidity'),
+        entry.get('wind', {}).get('speed'),
+        entry.get('wind', {}).get('deg'),
+        entry.get('clouds', {}).get('all'),
+        entry.get('pop', 0),
+        entry['weather'][0]['description'],
+        entry['weather'][0]['icon'],
+    ) for entry in payload['list']]
+
+
+def series_columns(rows):
+    """forecast_columns() for one location's rows from database.query_forecast_points"""
+    if not rows:
+        return forecast_columns({'list': []})
+
+    ts, offset, temp, feels_like, _, _, _, _, wind_speed, _, _, pop, description, icon = zip(*rows)
+    return _columns([0] * len(ts), ts, offset, temp, feels_like, wind_speed, pop, description, icon)
+
+
+def at_hours(minute, hours):
+    """Slot rank preferring the entry at hours[0] local time, then hours[1] and so on, else the one nearest hours[0].
+
+    Entries sit on a 3 hour UTC grid, so in cities whose offset isn't a
+    multiple of 3 hours no entry is exactly on the hour; those days take the
+    entry nearest hours[0], the later one on ties.
+    """
+    target = hours[0] * 60
+    rank = len(hours) + np.abs(minute - target) * 2 + (minute < target)
+    for i, hour in reversed(list(enumerate(hours))):
+        rank[minute == hour * 60] = i
+    return rank
+
+
+def first_from(minute, hour):
+    """Slot rank preferring the first entry at or after hour local time"""
+    return (minute < hour * 60).astype(np.int64)
+
+
+def daily_aggregates(columns, slot_rank):
+    """Aggregate columns per (location, local day), ordered by location then day.
+
+    Returns arrays of location, day, temp_min, temp_max and slot, the row
+    index of each day's representative entry: the lowest slot_rank, earliest
+    entry on ties.
+    """
+    count = len(columns['dt'])
+    if count == 0:
+        empty = np.array([], dtype=np.int64)
+        return {'location': empty, 'day': empty, 'slot': empty,
+                'temp_min': np.array([]), 'temp_max': np.array([])}
+
+    # lexsort's last key is the primary one
+    order = np.lexsort((np.arange(count), slot_rank, columns['day'], columns['location']))
+    location = columns['location'][order]
+    day = columns['day'][order]
+    temp = columns['temp'][order]
+
+    new_group = np.concatenate(([True], (location[1:] != location[:-1]) | (day[1:] != day[:-1])))
+    starts = np.flatnonzero(new_group)
+
+    return {
+        'location': location[starts],
+        'day': day[starts],
+        'slot': order[starts],
+        'temp_min': np.minimum.reduceat(temp, starts),
+        'temp_max': np.maximum.reduceat(temp, starts),
+    }
+
+
+def local_day(timezone_offset, timestamp=None):
+    """Day number (days since epoch) in a city's local time"""
+    timestamp = time.time() if timestamp is None else timestamp
+    return int((timestamp + timezone_offset) // SECONDS_PER_DAY)
+
+
+def day_strings(days):
+    """Format day numbers as YYYY-MM-DD"""
+    return np.datetime_as_string(np.asarray(days).astype('datetime64[D]'))
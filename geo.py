@@ -0,0 +1,99 @@
+import os
+
+from dotenv import load_dotenv
+
+from weather_cache import TTLCache
+
+load_dotenv()
+
+# Geohash length coordinates are snapped to; 5 is a ~4.9 x 4.9 km cell, 0 disables snapping
+GEOHASH_PRECISION = int(os.getenv("GEOHASH_PRECISION", "5"))
+GEOHASH_INDEX_TTL = float(os.getenv("GEOHASH_INDEX_TTL", "86400"))
+GEOHASH_INDEX_MAX_ENTRIES = int(os.getenv("GEOHASH_INDEX_MAX_ENTRIES", "100000"))
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: i for i, char in enumerate(_BASE32)}
+
+# Grid cell -> canonical OpenWeather city id, learned from coordinate lookups
+cell_index = TTLCache(GEOHASH_INDEX_MAX_ENTRIES, GEOHASH_INDEX_TTL)
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        # Bits alternate between longitude and latitude, starting with longitude
+        value, bounds = (lon, lon_range) if even else (lat, lat_range)
+        mid = (bounds[0] + bounds[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            bounds[0] = mid
+        else:
+            bits = bits * 2
+            bounds[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def geohash_decode(geohash):
+    """Return the (lat, lon) center of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bounds = lon_range if even else lat_range
+            mid = (bounds[0] + bounds[1]) / 2
+            if (value >> shift) & 1:
+                bounds[0] = mid
+            else:
+                bounds[1] = mid
+            even = not even
+
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+
+def snap_params(params):
+    """Snap lat/lon params to their grid cell, returns (params, cell).
+
+    If the cell has already been resolved to an OpenWeather city the
+    coordinates are replaced by that city's id, so every lookup in the
+    same area shares one cache entry. cell is None when nothing was snapped.
+    """
+    if GEOHASH_PRECISION <= 0 or params.get('lat') is None or params.get('lon') is None:
+        return params, None
+
+    cell = geohash_encode(float(params['lat']), float(params['lon']))
+    snapped = {k: v for k, v in params.items() if k not in ('lat', 'lon')}
+
+    city_id = cell_index.get(cell)
+    if city_id is not None:
+        snapped['id'] = city_id
+    else:
+        lat, lon = geohash_decode(cell)
+        snapped['lat'] = round(lat, 4)
+        snapped['lon'] = round(lon, 4)
+    return snapped, cell
+
+
+def remember_city(cell, payload):
+    """Record the canonical city OpenWeather resolved a grid cell to, returns its id (None if not recorded)"""
+    city_id = payload.get('id') or payload.get('city', {}).get('id')
+    if cell is not None and city_id:
+        cell_index.set(cell, city_id)
+        return city_id
+    return None
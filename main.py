@@ -2,26 +2,20 @@ import requests
 from datetime import datetime
 
 from dotenv import load_dotenv
+from weather_client import get_current, get_forecast
 
 load_dotenv()
 
-API_KEY = os.getenv("OPENWEATHER_API_KEY")
-BASE_URL = "http://api.openweathermap.org/data/2.5/weather"
-FORECAST_URL = "http://api.openweathermap.org/data/2.5/forecast"
-
 def kelvin_to_celsius(kelvin):
     return round(kelvin - 273.15, 2)
 
 def get_weather(city):
     params = {
-        'q': city,
-        'appid': API_KEY
+        'q': city
     }
-    response = requests.get(BASE_URL, params=params)
+    status_code, data = get_current(params)
     
-    if response.status_code == 200:
-        data = response.json()
-        
+    if status_code == 200:
         location = f"{data['name']}, {data['sys']['country']}"
         temp = kelvin_to_celsius(data['main']['temp'])
         feels_like = kelvin_to_celsius(data['main']['feels_like'])
@@ -58,14 +52,12 @@ def get_weather(city):
 
 def get_5daysweather(city):
     params = {
-        'q':city,
-        'appid': API_KEY
+        'q': city
     }
 
-    response = requests.get(FORECAST_URL, params=params)
+    status_code, data = get_forecast(params)
     
-    if response.status_code == 200:
-        data = response.json()
+    if status_code == 200:
         print(f"\n5-Day Forecast for {data['city']['name']}, {data['city']['country']}")
         print("-" * 40)
 
@@ -91,13 +83,11 @@ def get_5daysweather(city):
 
 def get_hourly_forecast(city):
     params = {
-        'q': city,
-        'appid': API_KEY
+        'q': city
     }
-    response = requests.get(FORECAST_URL, params=params)
+    status_code, data = get_forecast(params)
 
-    if response.status_code == 200:
-        data = response.json()
+    if status_code == 200:
         print(f"\nHourly Forecast for {data['city']['name']}, {data['city']['country']}")
         print("-" * 50)
         for entry in data['list'][:8]:  # every 3 hours data available, so next 24 hours
@@ -0,0 +1,128 @@
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from metrics import Counter
+from ratelimit import QUOTA_PROCESSES, RateLimited
+from resilience import CircuitOpen
+
+load_dotenv()
+
+# Upstream calls per minute the scheduler may spend on refreshes, 0 disables it.
+# Like the quota, it is split evenly between the WEB_CONCURRENCY processes.
+PREFETCH_BUDGET = float(os.getenv("PREFETCH_BUDGET", "60"))
+PREFETCH_INTERVAL = float(os.getenv("PREFETCH_INTERVAL", "15"))
+# Refresh a popular entry once it is this close to expiring
+PREFETCH_LEAD = float(os.getenv("PREFETCH_LEAD", "60"))
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "100"))
+# Recent lookups a location needs (decayed with this half-life) before it is prefetched
+PREFETCH_MIN_SCORE = float(os.getenv("PREFETCH_MIN_SCORE", "2"))
+PREFETCH_HALF_LIFE = float(os.getenv("PREFETCH_HALF_LIFE", "600"))
+PREFETCH_MAX_TRACKED = int(os.getenv("PREFETCH_MAX_TRACKED", "10000"))
+
+PREFETCH_REFRESHES = Counter('weather_prefetch_refreshes_total',
+                             'Cache entries refreshed ahead of expiry by the prefetch scheduler', ['result'])
+
+
+class PrefetchScheduler:
+    """Refresh the most requested cache entries before they expire.
+
+    record() counts lookups per key with exponential decay. Every interval a
+    background thread takes the top_n keys, picks those that expire within
+    lead seconds (or have already been evicted) and calls refresh(*item) for
+    them, most popular first, spending at most budget upstream calls a minute.
+    """
+
+    def __init__(self, refresh, remaining, budget=PREFETCH_BUDGET / max(QUOTA_PROCESSES, 1), interval=PREFETCH_INTERVAL,
+                 lead=PREFETCH_LEAD, top_n=PREFETCH_TOP_N, min_score=PREFETCH_MIN_SCORE,
+                 half_life=PREFETCH_HALF_LIFE, max_tracked=PREFETCH_MAX_TRACKED):
+        self.refresh = refresh
+        self.remaining = remaining
+        self.budget = budget
+        self.interval = interval
+        self.lead = lead
+        self.top_n = top_n
+        self.min_score = min_score
+        self.decay = 0.5 ** (interval / half_life)
+        self.max_tracked = max_tracked
+        self._scores = {}
+        self._items = {}
+        self._allowance = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, key, item):
+        """Count one lookup of key; item holds the arguments for refresh and remaining"""
+        with self._lock:
+            self._scores[key] = self._scores.get(key, 0.0) + 1
+            self._items[key] = item
+            # due() trims every tick; this only bounds a burst of new keys in between
+            if len(self._scores) > 2 * self.max_tracked:
+                self._trim()
+
+    def _trim(self):
+        """Forget the coldest keys beyond max_tracked in one batch; the caller holds the lock"""
+        if len(self._scores) <= self.max_tracked:
+            return
+        for key in sorted(self._scores, key=self._scores.get, reverse=True)[self.max_tracked:]:
+            del self._scores[key]
+            del self._items[key]
+
+    def due(self):
+        """Items to refresh this tick, most popular first, within the per-tick budget"""
+        per_tick = self.budget * self.interval / 60
+        with self._lock:
+            for key in list(self._scores):
+                self._scores[key] *= self.decay
+                if self._scores[key] < 0.1:
+                    del self._scores[key]
+                    del self._items[key]
+            self._trim()
+
+            popular = sorted(self._scores, key=self._scores.get, reverse=True)[:self.top_n]
+            items = [self._items[key] for key in popular if self._scores[key] >= self.min_score]
+
+        # Unspent budget carries over for one tick so a fractional per-tick budget still refreshes
+        self._allowance = min(self._allowance + per_tick, max(per_tick, 1.0))
+        due = []
+        for item in items:
+            if len(due) >= int(self._allowance):
+                break
+            remaining = self.remaining(*item)
+            if remaining is None or remaining <= self.lead:
+                due.append(item)
+        self._allowance -= len(due)
+        return due
+
+    def run_once(self):
+        for item in self.due():
+            try:
+                status_code = self.refresh(*item)
+            except (RateLimited, CircuitOpen):
+                # Foreground traffic needs the quota more, or the upstream is down; try again next tick
+                PREFETCH_REFRESHES.inc(result='skipped')
+                break
+            except Exception as e:
+                print(f"Prefetch refresh failed: {e}")
+                PREFETCH_REFRESHES.inc(result='error')
+            else:
+                PREFETCH_REFRESHES.inc(result='ok' if status_code == 200 else status_code)
+
+    def start(self):
+        if self.budget <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,240 @@
+"""Token-bucket limiter with priority queueing for calls to the OpenWeather API.
+
+Every upstream call takes a token first. When none is available callers wait
+in a priority queue: interactive /weather requests are served before batch
+items, CRUD validation and background refreshes. A waiter that can't get a
+token before its deadline gets RateLimited instead of calling the API. A 429
+from the upstream halves the rate and pauses all calls (for Retry-After when
+given); each successful call then wins a little of the rate back.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+
+from dotenv import load_dotenv
+
+from metrics import Counter, Gauge, Histogram
+
+load_dotenv()
+
+INTERACTIVE, BATCH, CRUD, BACKGROUND = range(4)
+PRIORITY_NAMES = ('interactive', 'batch', 'crud', 'background')
+
+# Calls per minute allowed by the OpenWeather plan (60 on the free plan), 0 means no limit
+QUOTA_PER_MINUTE = float(os.getenv("OPENWEATHER_QUOTA_PER_MINUTE", "0"))
+# The quota is split evenly between this many processes (gunicorn workers)
+QUOTA_PROCESSES = int(os.getenv("WEB_CONCURRENCY", "1"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "5"))
+
+# Seconds a call may wait for a token, by priority. Web requests stay under UPSTREAM_DEADLINE,
+# the CLI can wait for quota to come back and background refreshes never queue
+QUEUE_TIMEOUTS = (
+    float(os.getenv("RATE_LIMIT_WAIT_INTERACTIVE", "4")),
+    float(os.getenv("RATE_LIMIT_WAIT_BATCH", "4")),
+    float(os.getenv("RATE_LIMIT_WAIT_CRUD", "120")),
+    float(os.getenv("RATE_LIMIT_WAIT_BACKGROUND", "0")),
+)
+
+# Pause after a 429 without Retry-After, doubled on each consecutive one
+THROTTLE_BACKOFF = float(os.getenv("RATE_LIMIT_BACKOFF", "1"))
+THROTTLE_MAX_PAUSE = 60.0
+
+WAIT_SECONDS = Histogram('weather_ratelimit_wait_seconds',
+                         'Time upstream calls waited for a rate limit token', ['priority'],
+                         buckets=(0.001, 0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+REJECTED = Counter('weather_ratelimit_rejected_total',
+                   'Upstream calls dropped because no token was free before their deadline', ['priority'])
+THROTTLED = Counter('weather_ratelimit_throttled_total', '429 responses received from the upstream')
+
+
+class RateLimited(Exception):
+    """No rate limit token became available before the caller's deadline"""
+
+    def __init__(self, retry_after):
+        super().__init__("Weather service quota exhausted, try again shortly")
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('notify', 'granted', 'cancelled')
+
+    def __init__(self, notify):
+        self.notify = notify
+        self.granted = False
+        self.cancelled = False
+
+
+class RateLimiter:
+    """Token bucket refilled at rate tokens/second, holding at most burst tokens.
+
+    A rate of None disables the bucket; 429 pauses still apply. Waiters are
+    granted tokens by a dispatcher thread in (priority, arrival) order, so
+    threads and asyncio tasks share one queue.
+    """
+
+    def __init__(self, rate, burst=RATE_LIMIT_BURST):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.paused_until = 0.0
+        self._updated = time.monotonic()
+        self._strikes = 0
+        self._heap = []
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._dispatcher = None
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """Block until a token is granted; raises RateLimited after timeout seconds"""
+        timeout = QUEUE_TIMEOUTS[priority] if timeout is None else timeout
+        start = time.perf_counter()
+        self._check_pause(priority, timeout)
+        event = threading.Event()
+        waiter = self._enqueue(priority, event.set)
+        if waiter is not None and not event.wait(timeout) and self._cancel(waiter):
+            REJECTED.inc(priority=PRIORITY_NAMES[priority])
+            raise RateLimited(self.retry_after())
+        WAIT_SECONDS.observe(time.perf_counter() - start, priority=PRIORITY_NAMES[priority])
+
+    async def acquire_async(self, priority=INTERACTIVE, timeout=None):
+        """acquire() for asyncio callers, waiting without blocking the event loop"""
+        timeout = QUEUE_TIMEOUTS[priority] if timeout is None else timeout
+        start = time.perf_counter()
+        self._check_pause(priority, timeout)
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(priority, notify)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(asyncio.shield(granted), timeout if timeout > 0 else 0.001)
+            except asyncio.TimeoutError:
+                if self._cancel(waiter):
+                    REJECTED.inc(priority=PRIORITY_NAMES[priority])
+                    raise RateLimited(self.retry_after())
+            except asyncio.CancelledError:
+                self._cancel(waiter)
+                raise
+        WAIT_SECONDS.observe(time.perf_counter() - start, priority=PRIORITY_NAMES[priority])
+
+    def try_acquire(self):
+        """Take a token only if one is free right now and nobody is queued for it"""
+        with self._lock:
+            return not self._heap and self._take(time.monotonic())
+
+    def throttled(self, retry_after=None):
+        """The upstream answered 429: halve the rate and pause every caller"""
+        THROTTLED.inc()
+        with self._lock:
+            now = time.monotonic()
+            self._strikes += 1
+            if self.rate is not None:
+                self.rate = max(self.max_rate / 10, self.rate / 2)
+            self.tokens = 0
+            pause = retry_after if retry_after else THROTTLE_BACKOFF * 2 ** (self._strikes - 1)
+            self.paused_until = max(self.paused_until, now + min(pause, THROTTLE_MAX_PAUSE))
+            # Nothing accrues while paused
+            self._updated = self.paused_until
+        self._wake.set()
+
+    def succeeded(self):
+        """A call went through: win back 5% of the configured rate"""
+        with self._lock:
+            self._strikes = 0
+            if self.rate is not None and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def retry_after(self):
+        """Whole seconds until a token is likely to be free, for Retry-After headers"""
+        with self._lock:
+            now = time.monotonic()
+            wait = max(self.paused_until - now, 0.0)
+            if self.rate:
+                wait += (len(self._heap) + 1) / self.rate
+            return max(1, int(wait + 0.999))
+
+    def _check_pause(self, priority, timeout):
+        # Don't queue for a token that can't come before the deadline
+        if self.paused_until - time.monotonic() > timeout:
+            REJECTED.inc(priority=PRIORITY_NAMES[priority])
+            raise RateLimited(self.retry_after())
+
+    def _take(self, now):
+        if now < self.paused_until:
+            return False
+        if self.rate is None:
+            return True
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def _enqueue(self, priority, notify):
+        """Take a token right away if nobody is queued, else queue a waiter and return it"""
+        with self._lock:
+            if not self._heap and self._take(time.monotonic()):
+                return None
+            waiter = _Waiter(notify)
+            heapq.heappush(self._heap, (priority, next(self._seq), waiter))
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, name="ratelimit", daemon=True)
+                self._dispatcher.start()
+        self._wake.set()
+        return waiter
+
+    def _cancel(self, waiter):
+        """Withdraw a waiter that gave up; False if it was granted a token in the meantime"""
+        with self._lock:
+            if waiter.granted:
+                return False
+            waiter.cancelled = True
+            return True
+
+    def _dispatch(self):
+        while True:
+            self._wake.clear()
+            with self._lock:
+                now = time.monotonic()
+                while self._heap:
+                    waiter = self._heap[0][2]
+                    if waiter.cancelled:
+                        heapq.heappop(self._heap)
+                    elif self._take(now):
+                        heapq.heappop(self._heap)
+                        waiter.granted = True
+                        waiter.notify()
+                    else:
+                        break
+
+                if not self._heap:
+                    delay = None
+                elif now < self.paused_until:
+                    delay = self.paused_until - now
+                else:
+                    delay = max((1 - self.tokens) / self.rate, 0.001)
+            self._wake.wait(delay)
+
+
+def quota_limits():
+    """(tokens per second, burst) for this process; a full burst plus a minute of refill fits the quota"""
+    if QUOTA_PER_MINUTE <= 0:
+        return None, RATE_LIMIT_BURST
+    share = QUOTA_PER_MINUTE / max(QUOTA_PROCESSES, 1)
+    burst = max(min(RATE_LIMIT_BURST, share / 2), 1.0)
+    return max(share - burst, 1.0) / 60, burst
+
+
+limiter = RateLimiter(*quota_limits())
+
+Gauge('weather_ratelimit_rate', 'Current upstream calls per second allowed by the rate limiter', [],
+      lambda: {(): (limiter.rate or 0) * 1.0})
@@ -0,0 +1,119 @@
+"""Circuit breaker and latency tracking for the OpenWeather calls in weather_client.py."""
+import os
+import threading
+import time
+
+from collections import deque
+
+from dotenv import load_dotenv
+
+from metrics import Gauge
+
+load_dotenv()
+
+# Consecutive failed calls (errors, timeouts, 5xx) that open an endpoint's breaker
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+# Seconds an open breaker fails fast before letting one trial call through
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+
+breakers = {}
+
+
+class CircuitOpen(Exception):
+    """The endpoint's breaker is open, so the call was not attempted"""
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"Weather service is unavailable ({endpoint}), try again shortly")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Closed -> open after failure_threshold consecutive failures -> half-open after reset_timeout.
+
+    While open every call fails fast with CircuitOpen. Half-open lets a single
+    trial call through; its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        breakers[name] = self
+
+    def check(self):
+        """Raise CircuitOpen unless a call may go ahead now"""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+        raise CircuitOpen(self.name, self.retry_after())
+
+    def abandon(self):
+        """A call allowed by check() was never made"""
+        with self._lock:
+            self._trial_running = False
+
+    def succeeded(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+            self._trial_running = False
+
+    def failed(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    print(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def retry_after(self):
+        """Whole seconds until the breaker lets a trial call through"""
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        return max(1, int(remaining + 0.999))
+
+
+class LatencyWindow:
+    """Latencies of the last size successful calls, for picking the hedge delay"""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._p95 = None
+        self._since_sort = 0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+            self._since_sort += 1
+
+    def p95(self):
+        """95th percentile of the window, recomputed every 20 samples; None until min_samples"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            if self._p95 is None or self._since_sort >= 20:
+                ordered = sorted(self._samples)
+                # Nearest rank, ceil(0.95 * n) - 1, in integers so n * 0.95 can't round below a whole rank
+                self._p95 = ordered[min(len(ordered) - 1, -(-len(ordered) * 19 // 20) - 1)]
+                self._since_sort = 0
+            return self._p95
+
+
+Gauge('weather_circuit_breaker_state', 'Upstream circuit breaker state (0 closed, 1 half-open, 2 open)', ['endpoint'],
+      lambda: {(name,): (CLOSED, HALF_OPEN, OPEN).index(breaker.state) for name, breaker in breakers.items()})
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows: cross-process coalescing is unavailable
+    fcntl = None
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait and receive the same result (or exception). With lock_dir
+    set, leaders in different processes also serialize on a per-key lock file,
+    so gunicorn workers sharing a cache tier don't all hit the upstream at once.
+    """
+
+    def __init__(self, lock_dir=None):
+        self.lock_dir = lock_dir if fcntl else None
+        self._calls = {}
+        self._lock = threading.Lock()
+
+        if self.lock_dir:
+            os.makedirs(self.lock_dir, exist_ok=True)
+
+    def do(self, key, fn, recheck=None):
+        """Run fn() once for all concurrent callers with this key.
+
+        recheck() is consulted after waiting on another process's lock; a
+        non-None value is returned instead of calling fn().
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._run(key, fn, recheck)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def _run(self, key, fn, recheck):
+        if not self.lock_dir:
+            return fn()
+
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        with open(os.path.join(self.lock_dir, f"{name}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if recheck is not None:
+                    result = recheck()
+                    if result is not None:
+                        return result
+                return fn()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
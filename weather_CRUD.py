@@ -1,19 +1,36 @@
-import requests
-
 from datetime import datetime, timezone, timedelta
 from database import *
+from weather_client import geocode, get_forecast
+from ratelimit import CRUD
+from forecast_engine import (forecast_columns, series_columns, series_points, daily_aggregates, first_from,
+                             day_strings, SECONDS_PER_DAY)
 
+import argparse
 import json
 import csv
+import gzip
+import itertools
 import os
+import sys
+import textwrap
+import time
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
 
 from dotenv import load_dotenv
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+
 load_dotenv()
 
-API_KEY = os.getenv("OPENWEATHER_API_KEY")
-BASE_URL = "https://api.openweathermap.org/data/2.5/weather"
-FORECAST_URL = "https://api.openweathermap.org/data/2.5/forecast"
+# Keep every 3-hourly forecast point in forecast_points and derive the daily records from it
+STORE_FORECAST_SERIES = os.getenv("STORE_FORECAST_SERIES", "0").lower() in ("1", "true", "yes")
 
 def validate_date(date_string):
     try:
@@ -42,10 +59,9 @@ def validate_date_range(start_date, end_date):
     except ValueError:
         return False, "Invalid date format"
 
-def validate_location(location_type, location):
-    """Validate location exists by making API call"""
+def location_params(location_type, location):
+    """OpenWeather query params for a CLI location; raises ValueError for malformed lat/lon"""
     params = {
-        'appid': API_KEY,
         'units': 'metric'
     }
     
@@ -57,100 +73,90 @@ def validate_location(location_type, location):
             location = f"{location},US"
         params['zip'] = location
     elif location_type == 'latlon':
-        try:
-            lat, lon = map(float, location.split(','))
-            params['lat'] = lat
-            params['lon'] = lon
-        except ValueError:
-            return False, "Invalid lat/lon format. Use: latitude,longitude"
+        lat, lon = map(float, location.split(','))
+        params['lat'] = lat
+        params['lon'] = lon
     
+    return params
+
+def place_name(place):
+    return f"{place['name']}, {place['country']}" if place.get('country') else place['name']
+
+def validate_location(location_type, location):
+    """Validate location exists, returns (True, place) or (False, error message).
+
+    place comes from the geocodes table (see weather_client.geocode), so a
+    location that was resolved before costs no API call.
+    """
     try:
-        response = requests.get(BASE_URL, params=params)
-        if response.status_code == 200:
-            data = response.json()
-            actual_location = f"{data['name']}, {data['sys']['country']}"
-            return True, actual_location
+        params = location_params(location_type, location)
+    except ValueError:
+        return False, "Invalid lat/lon format. Use: latitude,longitude"
+    
+    try:
+        # Lower priority than the web app's requests; waits for quota instead of failing
+        status_code, place = geocode(params, priority=CRUD)
+        if status_code == 200:
+            return True, place
         else:
-            return False, f"Location not found: {response.json().get('message', 'Unknown error')}"
+            return False, f"Location not found: {place.get('message', 'Unknown error')}"
     except Exception as e:
         return False, f"Error validating location: {str(e)}"
 
-def fetch_weather_data_range(location_type, location, start_date, end_date):
+def fetch_weather_data_range(place, start_date, end_date):
+    """Daily forecast entries between start_date and end_date for a place returned by validate_location"""
+    # Querying by the resolved coordinates keeps the cache key the same however the location was typed
     params = {
-        'appid': API_KEY,
+        'lat': place['lat'],
+        'lon': place['lon'],
         'units': 'metric'
     }
     
-    if location_type == 'city':
-        params['q'] = location
-    elif location_type == 'zip':
-        if ',' not in location:
-            location = f"{location},US"
-        params['zip'] = location
-    elif location_type == 'latlon':
-        lat, lon = map(float, location.split(','))
-        params['lat'] = lat
-        params['lon'] = lon
-    
     try:
-        response = requests.get(FORECAST_URL, params=params)
-        if response.status_code != 200:
+        status_code, forecast_data = get_forecast(params, priority=CRUD)
+        if status_code != 200:
             return None
         
-        forecast_data = response.json()
-        
         start = datetime.strptime(start_date, '%Y-%m-%d').date()
         end = datetime.strptime(end_date, '%Y-%m-%d').date()
+        epoch = datetime(1970, 1, 1).date()
         
-        daily_data = {}
-        for entry in forecast_data['list']:
-            entry_date = datetime.fromtimestamp(entry['dt']).date()
-            
-            if start <= entry_date <= end:
-                if entry_date not in daily_data:
-                    daily_data[entry_date] = []
-                daily_data[entry_date].append(entry)
+        if STORE_FORECAST_SERIES:
+            # Stored points include slots from earlier fetches that have since left the forecast
+            store_forecast_points(place['id'], series_points(forecast_data))
+            timezone_offset = forecast_data['city']['timezone']
+            columns = series_columns(query_forecast_points(
+                place['id'],
+                (start - epoch).days * SECONDS_PER_DAY - timezone_offset,
+                ((end - epoch).days + 1) * SECONDS_PER_DAY - timezone_offset - 1
+            ))
+        else:
+            columns = forecast_columns(forecast_data)
+        
+        # Group by the city's local day; each day is represented by its first entry from noon on
+        days = daily_aggregates(columns, first_from(columns['minute'], 12))
+        in_range = np.flatnonzero((days['day'] >= (start - epoch).days) & (days['day'] <= (end - epoch).days))
         
         weather_data_list = []
-        current_date = start
         
-        while current_date <= end:
-            if current_date in daily_data:
-                day_entries = daily_data[current_date]
-                
-                midday_entry = None
-                for entry in day_entries:
-                    entry_hour = datetime.fromtimestamp(entry['dt']).hour
-                    if entry_hour >= 12:  # Take 3PM weather data
-                        midday_entry = entry
-                        break
-                
-                if not midday_entry:
-                    midday_entry = day_entries[0]  # Fallback to first entry
-                
-                temps = [e['main']['temp'] for e in day_entries]
-                temp_min = min(temps)
-                temp_max = max(temps)
-                
-                timezone_offset = forecast_data['city']['timezone']
-                local_time = datetime.fromtimestamp(
-                    midday_entry['dt'] + timezone_offset, tz=timezone.utc
-                ).strftime('%a, %b %d %I:%M %p')
-                
-                day_weather = {
-                    "date": current_date.strftime('%Y-%m-%d'),
-                    "temp": round(midday_entry['main']['temp'], 1),
-                    "temp_min": round(temp_min, 1),
-                    "temp_max": round(temp_max, 1),
-                    "feels_like": round(midday_entry['main']['feels_like'], 1),
-                    "description": midday_entry['weather'][0]['description'],
-                    "local_time": local_time,
-                    "weather_icon": midday_entry['weather'][0]['icon']
-                }
-                
-                weather_data_list.append(day_weather)
+        for i, date_str in zip(in_range, day_strings(days['day'][in_range])):
+            slot = days['slot'][i]
+            local_time = datetime.fromtimestamp(
+                int(columns['dt'][slot] + columns['offset'][slot]), tz=timezone.utc
+            ).strftime('%a, %b %d %I:%M %p')
+            
+            day_weather = {
+                "date": str(date_str),
+                "temp": round(float(columns['temp'][slot]), 1),
+                "temp_min": round(float(days['temp_min'][i]), 1),
+                "temp_max": round(float(days['temp_max'][i]), 1),
+                "feels_like": round(float(columns['feels_like'][slot]), 1),
+                "description": columns['description'][slot],
+                "local_time": local_time,
+                "weather_icon": columns['icon'][slot]
+            }
             
-            current_date += timedelta(days=1)
+            weather_data_list.append(day_weather)
         
         return weather_data_list
         
@@ -158,6 +164,28 @@ def fetch_weather_data_range(location_type, location, start_date, end_date):
         print(f"Error fetching weather data: {str(e)}")
         return None
 
+def day_records(base_label, location_type, location, weather_data_list, location_id=None):
+    """One record per forecast day, labelled "<base_label> - Day N" when there are several"""
+    new_records = []
+    
+    for i, day_weather in enumerate(weather_data_list, 1):
+        if len(weather_data_list) == 1:
+            day_label = base_label
+        else:
+            day_label = f"{base_label} - Day {i}"
+        
+        new_records.append({
+            'label': day_label,
+            'location_type': location_type,
+            'location': location,
+            'start_date': day_weather['date'],
+            'end_date': day_weather['date'],
+            'weather_data': day_weather,
+            'location_id': location_id
+        })
+    
+    return new_records
+
 def create_record():
     print("\n" + "="*50)
     print("CREATE NEW WEATHER RECORDS")
@@ -194,9 +222,9 @@ def create_record():
         location = input("Enter latitude,longitude (e.g., '40.7128,-74.0060'): ").strip()
     
     print("🔍 Validating location...")
-    is_valid, result = validate_location(location_type, location)
+    is_valid, place = validate_location(location_type, location)
     if not is_valid:
-        print(f"{result}")
+        print(f"{place}")
         return
     
     print(f"\nDate Range (Today: {datetime.now().strftime('%Y-%m-%d')}, Max: 5 days from today)")
@@ -219,51 +247,209 @@ def create_record():
             print("Invalid date format. Use YYYY-MM-DD")
     
     print("Fetching weather forecast data...")
-    weather_data_list = fetch_weather_data_range(location_type, location, start_date, end_date)
+    weather_data_list = fetch_weather_data_range(place, start_date, end_date)
     if not weather_data_list:
         print("Failed to fetch weather data for the specified date range")
         return
     
     print(f"Creating {len(weather_data_list)} weather records...")
-    created_records = []
-    
-    for i, day_weather in enumerate(weather_data_list, 1):
-        if len(weather_data_list) == 1:
-            day_label = base_label
-        else:
-            day_label = f"{base_label} - Day {i}"
-        
-        record_id = create_weather_record(
-            label=day_label,
-            location_type=location_type,
-            location=location,
-            start_date=day_weather['date'],
-            end_date=day_weather['date'],
-            weather_data=day_weather
-        )
-        
-        created_records.append((record_id, day_weather))
-        # print(f"Day {i} record created (ID: {record_id})")
-    
+    new_records = day_records(base_label, location_type, location, weather_data_list, place['id'])
+    record_ids = create_weather_records(new_records)
+    created_records = list(zip(record_ids, weather_data_list))
     
     print(f"\nRecords Summary:")
     print(f"Base Label: {base_label}")
-    print(f"Location: {result}")
+    print(f"Location: {place_name(place)}")
     print(f"Date Range: {start_date} to {end_date}")
     print("\nDaily Weather:")
     print("-" * 60)
     for record_id, day_data in created_records:
         print(f"ID {record_id}: {day_data['date']} - {day_data['temp']}°C ({day_data['temp_min']}-{day_data['temp_max']}°C), {day_data['description'].title()}")
 
+# Bulk import: rows are fetched concurrently and stored in batches, one transaction per batch
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "8"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+IMPORT_COLUMNS = ('label', 'location_type', 'location', 'start', 'end')
+
+def read_import_rows(path):
+    """Yield (line number, row dict, None) from a CSV file with a header, or NDJSON (.ndjson/.jsonl).
+
+    An NDJSON line that isn't a JSON object is yielded as (line number, None, error message).
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith(('.ndjson', '.jsonl')):
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_number, None, f"invalid JSON: {e}"
+                    continue
+                if isinstance(row, dict):
+                    yield line_number, row, None
+                else:
+                    yield line_number, None, "not a JSON object"
+        else:
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row, None
+
+def fetch_import_row(row):
+    """Validate one import row and fetch its forecast, returns (records, None) or (None, error message)"""
+    missing = [column for column in IMPORT_COLUMNS if not str(row.get(column) or '').strip()]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+    
+    label, location_type, location, start_date, end_date = (str(row[column]).strip() for column in IMPORT_COLUMNS)
+    if location_type not in ('city', 'zip', 'latlon'):
+        return None, f"unknown location_type '{location_type}' (use city, zip or latlon)"
+    if not (validate_date(start_date) and validate_date(end_date)):
+        return None, "invalid date format, use YYYY-MM-DD"
+    is_valid, message = validate_date_range(start_date, end_date)
+    if not is_valid:
+        return None, message
+    
+    is_valid, place = validate_location(location_type, location)
+    if not is_valid:
+        return None, place
+    
+    weather_data_list = fetch_weather_data_range(place, start_date, end_date)
+    if not weather_data_list:
+        return None, "no forecast data for the date range"
+    
+    return day_records(label, location_type, location, weather_data_list, place['id']), None
+
+def import_records(path, workers=IMPORT_WORKERS, batch_size=IMPORT_BATCH_SIZE):
+    """Create records for every row of an import file without prompting, returns the number of failed rows.
+
+    Rows stored by an earlier run of the same file are skipped, so an
+    interrupted import can simply be run again. Lines that can't be parsed
+    are reported once and marked done. Other failed rows are reported and
+    not marked done, so they are retried on the next run.
+    """
+    source = os.path.abspath(path)
+    done = get_imported_lines(source)
+    rows = []
+    unreadable = []
+    for line, row, error in read_import_rows(path):
+        if line in done:
+            continue
+        if error:
+            print(f"Line {line}: {error}")
+            unreadable.append(line)
+        else:
+            rows.append((line, row))
+    if done:
+        print(f"Resuming: {len(done)} rows already imported")
+    # Retrying can't fix these, so resume skips them
+    mark_lines_imported(source, unreadable)
+    print(f"Importing {len(rows)} rows with {workers} workers...")
+    
+    start = time.perf_counter()
+    batch, batch_lines = [], []
+    stats = {'rows': 0, 'records': 0, 'failed': len(unreadable)}
+    last_report = start
+    
+    def flush():
+        if batch:
+            create_weather_records(batch, imported=(source, batch_lines))
+            stats['records'] += len(batch)
+            batch.clear()
+            batch_lines.clear()
+    
+    def report():
+        elapsed = time.perf_counter() - start
+        print(f"{stats['rows']}/{len(rows)} rows, {stats['records']} records stored, {stats['failed']} failed, "
+              f"{stats['rows'] / elapsed if elapsed else 0:.1f} rows/s")
+    
+    pending = iter(rows)
+    in_flight = {}
+    pool = ThreadPoolExecutor(max_workers=workers)
+    try:
+        while True:
+            # Keep a bounded window in flight rather than queueing the whole file
+            for line, row in itertools.islice(pending, workers * 2 - len(in_flight)):
+                in_flight[pool.submit(fetch_import_row, row)] = line
+            if not in_flight:
+                break
+            
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                line = in_flight.pop(future)
+                try:
+                    records, error = future.result()
+                except Exception as e:
+                    # One bad row must not lose the rows already fetched for this batch
+                    records, error = None, f"{type(e).__name__}: {e}"
+                stats['rows'] += 1
+                if error:
+                    stats['failed'] += 1
+                    print(f"Line {line}: {error}")
+                    continue
+                batch.extend(records)
+                batch_lines.append(line)
+            
+            if len(batch) >= batch_size:
+                flush()
+            if time.perf_counter() - last_report >= 5:
+                report()
+                last_report = time.perf_counter()
+    except KeyboardInterrupt:
+        # Keep what finished; the rest is picked up by the next run
+        pool.shutdown(wait=False, cancel_futures=True)
+        flush()
+        report()
+        print("Import interrupted. Run the same command again to resume.")
+        raise
+    
+    pool.shutdown()
+    flush()
+    report()
+    print(f"Import finished in {time.perf_counter() - start:.1f}s")
+    return stats['failed']
+
+PAGE_SIZE = 20
+
+def page_records(print_record, **filters):
+    """Print records a page at a time, newest first. Returns how many were shown."""
+    shown = 0
+    cursor = None
+    
+    while True:
+        records, cursor = query_records(limit=PAGE_SIZE, after=cursor, **filters)
+        for record in records:
+            print_record(record)
+        shown += len(records)
+        
+        if cursor is None:
+            return shown
+        if input("-- Press Enter for more, or 'q' to stop listing: ").strip().lower() == 'q':
+            return shown
+
+def prompt_filters():
+    """Ask for optional record filters, returns kwargs for query_records"""
+    if input("Filter records? (y/N): ").strip().lower() not in ['yes', 'y']:
+        return {}
+    
+    filters = {
+        'location': input("Location (exact, Enter to skip): ").strip(),
+        'start_from': input("From date YYYY-MM-DD (Enter to skip): ").strip(),
+        'start_to': input("To date YYYY-MM-DD (Enter to skip): ").strip(),
+        'label': input("Label contains (Enter to skip): ").strip()
+    }
+    return {key: value for key, value in filters.items() if value}
+
 def read_records():
-    """Display all weather records"""
+    """Display weather records a page at a time"""
     print("\n" + "="*80)
     print("ALL WEATHER RECORDS")
     print("="*80)
     
-    records = read_all_records()
+    filters = prompt_filters()
+    total = count_records(**filters)
     
-    if not records:
+    if not total:
         print("No weather records found.")
         return
     
@@ -271,25 +457,23 @@ def read_records():
     print(f"{'ID':<4} {'Label':<25} {'Location':<15} {'Date':<12} {'Temp':<8} {'Description':<15}")
     print("-" * 80)
     
-    for record in records:
+    def print_row(record):
         print(f"{record['id']:<4} {record['label'][:24]:<25} {record['location'][:14]:<15} {record['start_date']:<12} {record['temp']:.1f}°C {record['description'][:14]:<15}")
     
-    print(f"\nTotal records: {len(records)}")
+    page_records(print_row, **filters)
+    
+    print(f"\nTotal records: {total}")
 
 def update_record():
     print("\n" + "="*50)
     print("UPDATE RECORD LABEL")
     print("="*50)
     
-    records = read_all_records()
-    if not records:
+    print("Current records:")
+    if not page_records(lambda record: print(f"ID {record['id']}: {record['label']} ({record['start_date']})")):
         print("No records available to update.")
         return
     
-    print("Current records:")
-    for record in records:
-        print(f"ID {record['id']}: {record['label']} ({record['start_date']})")
-    
     while True:
         try:
             record_id = int(input("\nEnter record ID to update: "))
@@ -320,15 +504,11 @@ def delete_record_menu():
     print("DELETE WEATHER RECORD")
     print("="*50)
     
-    records = read_all_records()
-    if not records:
+    print("Current records:")
+    if not page_records(lambda record: print(f"ID {record['id']}: {record['label']} - {record['location']} ({record['start_date']})")):
         print("No records available to delete.")
         return
     
-    print("Current records:")
-    for record in records:
-        print(f"ID {record['id']}: {record['label']} - {record['location']} ({record['start_date']})")
-    
     while True:
         try:
             record_id = int(input("\nEnter record ID to delete: "))
@@ -356,8 +536,9 @@ def delete_record_menu():
     else:
         print("Deletion cancelled.")
 
-def export_to_json(records, filename=None):
-    if not records:
+def export_to_json(filename=None):
+    total = count_records()
+    if not total:
         print("No records to export.")
         return False
     
@@ -372,17 +553,24 @@ def export_to_json(records, filename=None):
         os.makedirs('exports', exist_ok=True)
         filepath = os.path.join('exports', filename)
         
-        export_data = {
+        export_info = {
             "export_info": {
                 "exported_at": datetime.now().isoformat(),
-                "total_records": len(records),
+                "total_records": total,
                 "format": "JSON"
-            },
-            "weather_records": records
+            }
         }
         
+        # Write the array one record at a time, laid out exactly like json.dump(..., indent=2)
         with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, indent=2, ensure_ascii=False)
+            header = json.dumps(export_info, indent=2, ensure_ascii=False)
+            f.write(header[:-len("\n}")] + ',\n  "weather_records": [')
+            
+            for i, record in enumerate(iter_records()):
+                f.write(",\n" if i else "\n")
+                f.write(textwrap.indent(json.dumps(record, indent=2, ensure_ascii=False), "    "))
+            
+            f.write("\n  ]\n}")
         
         return True
         
@@ -390,8 +578,8 @@ def export_to_json(records, filename=None):
         print(f"JSON export failed: {str(e)}")
         return False
 
-def export_to_csv(records, filename=None):
-    if not records:
+def export_to_csv(filename=None):
+    if not count_records():
         print("No records to export.")
         return False
     
@@ -418,7 +606,7 @@ def export_to_csv(records, filename=None):
             
             writer.writeheader()
             
-            for record in records:
+            for record in iter_records():
                 writer.writerow({
                     'ID': record['id'],
                     'Label': record['label'],
@@ -441,26 +629,108 @@ def export_to_csv(records, filename=None):
         print(f"CSV export failed: {str(e)}")
         return False
 
+PARQUET_BATCH_SIZE = 5000
+
+def write_ndjson_gz(records, filepath):
+    count = 0
+    last = None
+    with gzip.open(filepath, 'wt', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+            last = record
+    return last, count
+
+def write_parquet(records, filepath):
+    schema = pa.schema([
+        ('id', pa.int64()), ('label', pa.string()), ('location_type', pa.string()),
+        ('location', pa.string()), ('start_date', pa.string()), ('end_date', pa.string()),
+        ('temp', pa.float64()), ('temp_min', pa.float64()), ('temp_max', pa.float64()),
+        ('feels_like', pa.float64()), ('description', pa.string()), ('local_time', pa.string()),
+        ('weather_icon', pa.string()), ('created_at', pa.string()), ('updated_at', pa.string()),
+        ('change_seq', pa.int64())
+    ])
+    
+    count = 0
+    last = None
+    with pq.ParquetWriter(filepath, schema, compression='zstd') as writer:
+        while True:
+            batch = list(itertools.islice(records, PARQUET_BATCH_SIZE))
+            if not batch:
+                break
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+            last = batch[-1]
+    return last, count
+
+def export_incremental(fmt='ndjson', filename=None, name='default'):
+    """Export only records created or updated since the last incremental export with this name"""
+    if fmt == 'parquet' and pa is None:
+        print("Parquet export needs pyarrow (pip install pyarrow).")
+        return False
+    
+    records = iter_records_since(get_export_watermark(name))
+    first = next(records, None)
+    if first is None:
+        print("No records changed since the last export.")
+        return False
+    records = itertools.chain([first], records)
+    
+    extension = '.parquet' if fmt == 'parquet' else '.ndjson.gz'
+    if not filename:
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"weather_changes_{timestamp}{extension}"
+    
+    if not filename.endswith(extension):
+        filename += extension
+    
+    try:
+        os.makedirs('exports', exist_ok=True)
+        filepath = os.path.join('exports', filename)
+        
+        if fmt == 'parquet':
+            last, count = write_parquet(records, filepath)
+        else:
+            last, count = write_ndjson_gz(records, filepath)
+        
+        # Only move the watermark once the file is complete, so a failed export is retried in full
+        set_export_watermark(name, last['change_seq'])
+        print(f"Exported {count} changed records to {filepath}")
+        return True
+        
+    except Exception as e:
+        print(f"Incremental export failed: {str(e)}")
+        return False
+
 def export_data_menu():
     print("\n" + "="*50)
     print("DATA EXPORT")
     print("="*50)
     
-    records = read_all_records()
-    if not records:
+    total = count_records()
+    if not total:
         print("No records available to export.")
         return
     
-    print(f"Found {len(records)} records to export.")
+    print(f"Found {total} records to export.")
     print("\nExport Options:")
     print("1. JSON - Structured data format")
     print("2. CSV - Spreadsheet compatible")
     print("3. Both formats")
-    print("4. Back to main menu")
+    print("4. Incremental - Only changes since last incremental export")
+    print("5. Back to main menu")
+    
+    choice = input("Choose export format (1-5): ").strip()
     
-    choice = input("Choose export format (1-4): ").strip()
+    if choice == '5':
+        return
     
     if choice == '4':
+        fmt = 'ndjson'
+        if pa is not None and input("Format - 1. gzip NDJSON, 2. Parquet (1-2): ").strip() == '2':
+            fmt = 'parquet'
+        custom_filename = input("Enter filename (press Enter for auto-generation): ").strip()
+        export_incremental(fmt, custom_filename or None)
         return
     
     custom_filename = input("Enter filename (press Enter for auto-generation): ").strip()
@@ -470,15 +740,15 @@ def export_data_menu():
     success_count = 0
     
     if choice == '1':
-        if export_to_json(records, custom_filename):
+        if export_to_json(custom_filename):
             success_count += 1
     elif choice == '2':
-        if export_to_csv(records, custom_filename):
+        if export_to_csv(custom_filename):
             success_count += 1
     elif choice == '3':
-        if export_to_json(records, custom_filename):
+        if export_to_json(custom_filename):
             success_count += 1
-        if export_to_csv(records, custom_filename):
+        if export_to_csv(custom_filename):
             success_count += 1
     else:
         print("Invalid choice.")
@@ -488,6 +758,45 @@ def export_data_menu():
         print("\nExport failed.")
 
 
+def link_older_records():
+    """Give records created before location keys existed their geocodes id"""
+    for location_type, location in unlinked_locations():
+        is_valid, place = validate_location(location_type, location)
+        if is_valid:
+            print(f"{location}: {link_location(location_type, location, place['id'])} records linked to {place_name(place)}")
+        else:
+            print(f"{location}: {place}")
+
+def summary_menu():
+    """Average, min and max temperature per location per day or week, from location_daily_stats"""
+    print("\n" + "="*80)
+    print("TEMPERATURE SUMMARY")
+    print("="*80)
+    
+    unlinked = len(unlinked_locations())
+    if unlinked:
+        print(f"{unlinked} locations in older records have no location key and are left out.")
+        if input("Resolve them now? (y/N): ").strip().lower() in ['yes', 'y']:
+            link_older_records()
+    
+    period = 'week' if input("Group by (d)ay or (w)eek? [d]: ").strip().lower().startswith('w') else 'day'
+    start_from = input("From date YYYY-MM-DD (Enter to skip): ").strip() or None
+    start_to = input("To date YYYY-MM-DD (Enter to skip): ").strip() or None
+    
+    rows = query_location_stats(period, start_from=start_from, start_to=start_to)
+    if not rows:
+        print("No weather records found.")
+        return
+    
+    print(f"\n{'Location':<25} {'Week of' if period == 'week' else 'Date':<12} {'Records':>7} {'Avg':>8} {'Min':>8} {'Max':>8}")
+    print("-" * 80)
+    for row in rows:
+        name = place_name(row) if row['name'] else f"#{row['location_id']}"
+        avg = f"{row['avg_temp']:.1f}°C" if row['avg_temp'] is not None else '-'
+        low = f"{row['min_temp']:.1f}°C" if row['min_temp'] is not None else '-'
+        high = f"{row['max_temp']:.1f}°C" if row['max_temp'] is not None else '-'
+        print(f"{name[:24]:<25} {row['period']:<12} {row['records']:>7} {avg:>8} {low:>8} {high:>8}")
+
 def main_menu():
     init_database()
     
@@ -500,10 +809,11 @@ def main_menu():
         print("3. Update - Edit record label")
         print("4. Delete - Remove record")
         print("5. Export - Save data to files")
-        print("6. Exit")
+        print("6. Summary - Temperature per location per day or week")
+        print("7. Exit")
         print("="*50)
         
-        choice = input("Choose an option (1-6): ").strip()
+        choice = input("Choose an option (1-7): ").strip()
         
         if choice == '1':
             create_record()
@@ -516,10 +826,27 @@ def main_menu():
         elif choice == '5':
             export_data_menu()
         elif choice == '6':
+            summary_menu()
+        elif choice == '7':
             break
         else:
-            print("Invalid choice. Please enter 1-5.")
+            print("Invalid choice. Please enter 1-7.")
 
 
 if __name__ == "__main__":
-    main_menu()
+    parser = argparse.ArgumentParser(description="Weather records CLI. Without a command it opens the interactive menu.")
+    subparsers = parser.add_subparsers(dest='command')
+    importer = subparsers.add_parser('import', help="create records from a CSV or NDJSON file without prompting")
+    importer.add_argument('path', help="rows of label, location_type (city, zip or latlon), location, start, end")
+    importer.add_argument('--workers', type=int, default=IMPORT_WORKERS, help="concurrent forecast fetches")
+    importer.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE, help="records stored per transaction")
+    args = parser.parse_args()
+    
+    if args.command == 'import':
+        init_database()
+        try:
+            sys.exit(1 if import_records(args.path, args.workers, args.batch_size) else 0)
+        except KeyboardInterrupt:
+            sys.exit(130)
+    else:
+        main_menu()
@@ -0,0 +1,179 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+import database
+
+load_dotenv()
+
+# Current conditions change faster than the 3-hourly forecast, so they expire sooner
+CURRENT_TTL = float(os.getenv("CURRENT_CACHE_TTL", "600"))
+FORECAST_TTL = float(os.getenv("FORECAST_CACHE_TTL", "1800"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "1024"))
+
+# Seconds past expiry an entry may still be served while a background refresh runs
+CACHE_STALE_TTL = float(os.getenv("CACHE_STALE_TTL", "300"))
+
+# Share payloads across workers, the CLI and restarts through SQLite (see database.py)
+PERSISTENT_CACHE = os.getenv("PERSISTENT_CACHE", "0").lower() in ("1", "true", "yes")
+
+
+class TTLCache:
+    """Thread-safe in-process cache with per-entry expiry and LRU eviction.
+
+    With persist_as set, entries are also written through to the shared
+    SQLite cache tier and memory misses fall back to it. Expired entries are
+    kept in memory for stale_ttl more seconds so lookup() can serve them
+    while the caller refreshes in the background, and after that until LRU
+    eviction as the last known good copy for last_known().
+    """
+
+    def __init__(self, maxsize, ttl, persist_as=None, stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.persist_as = persist_as
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the fresh value for key, or None"""
+        return self._lookup(key, allow_stale=False)[0]
+
+    def lookup(self, key):
+        """Return (value, stale); stale values are past their TTL but within stale_ttl"""
+        return self._lookup(key, allow_stale=True)
+
+    def _lookup(self, key, allow_stale):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1], False
+            if entry is not None and entry[0] + self.stale_ttl <= now:
+                entry = None
+
+        # Another worker may already have refreshed it in the shared tier
+        value = self._load(key)
+        with self._lock:
+            if value is not None:
+                self.hits += 1
+                return value, False
+            if entry is not None and allow_stale:
+                self._data.move_to_end(key)
+                self.stale_hits += 1
+                return entry[1], True
+            self.misses += 1
+            return None, False
+
+    def reload(self, key):
+        """Replace the in-memory entry for key with the shared tier's copy, None if there is none"""
+        return self._load(key)
+
+    def last_known(self, key):
+        """The value stored for key however old it is, or None"""
+        with self._lock:
+            entry = self._data.get(key)
+            return None if entry is None else entry[1]
+
+    def remaining(self, key):
+        """Seconds until the in-memory entry for key expires, None if there is none"""
+        with self._lock:
+            entry = self._data.get(key)
+            return None if entry is None else entry[0] - time.monotonic()
+
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        self._store(key, value, ttl)
+
+        if self.persist_as:
+            try:
+                database.cache_put(self.persist_as, json.dumps(key), json.dumps(value), time.time() + ttl)
+            except sqlite3.Error as e:
+                print(f"Persistent cache write failed: {e}")
+
+    def _store(self, key, value, ttl):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def _load(self, key):
+        if not self.persist_as:
+            return None
+
+        try:
+            row = database.cache_get(self.persist_as, json.dumps(key))
+        except sqlite3.Error as e:
+            print(f"Persistent cache read failed: {e}")
+            return None
+        if row is None:
+            return None
+
+        value = json.loads(row[0])
+        self._store(key, value, row[1] - time.time())
+        return value
+
+    def warm_start(self):
+        """Fill memory from the persistent tier so a fresh worker starts hot"""
+        if not self.persist_as:
+            return 0
+
+        rows = database.cache_load(self.persist_as, self.maxsize)
+        # Oldest first so the freshest entries end up most recently used
+        for cache_key, payload, expires_at in reversed(rows):
+            self._store(tuple(json.loads(cache_key)), json.loads(payload), expires_at - time.time())
+        return len(rows)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+            self.stale_hits = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale_hits": self.stale_hits,
+            }
+
+
+def _normalize(text):
+    # "  new york , US" and "New York,us" should share an entry
+    return ",".join(" ".join(part.split()) for part in str(text).lower().split(","))
+
+
+def location_key(params):
+    """Build a normalized (location-kind, query, units) key from OpenWeather request params"""
+    units = params.get('units', 'standard')
+
+    if params.get('id'):
+        return ('id', str(params['id']), units)
+    if params.get('lat') is not None and params.get('lon') is not None:
+        return ('latlon', f"{float(params['lat']):.4f},{float(params['lon']):.4f}", units)
+    if params.get('zip'):
+        return ('zip', _normalize(params['zip']), units)
+    return ('q', _normalize(params.get('q', '')), units)
+
+
+if PERSISTENT_CACHE:
+    database.init_cache_database()
+
+current_cache = TTLCache(CACHE_MAX_ENTRIES, CURRENT_TTL, 'weather' if PERSISTENT_CACHE else None, CACHE_STALE_TTL)
+forecast_cache = TTLCache(CACHE_MAX_ENTRIES, FORECAST_TTL, 'forecast' if PERSISTENT_CACHE else None, CACHE_STALE_TTL)
@@ -0,0 +1,517 @@
+import asyncio
+import os
+import random
+import threading
+import time
+
+import requests
+
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # only the ASGI app (asgi.py) needs it
+    httpx = None
+
+import database
+
+from geo import snap_params, remember_city
+from metrics import Counter, Histogram
+from prefetch import PrefetchScheduler
+from ratelimit import BACKGROUND, INTERACTIVE, RateLimited, limiter
+from resilience import CircuitBreaker, CircuitOpen, LatencyWindow
+from singleflight import SingleFlight
+from weather_cache import PERSISTENT_CACHE, location_key, current_cache, forecast_cache
+
+load_dotenv()
+
+API_KEY = os.getenv("OPENWEATHER_API_KEY")
+API_BASE = os.getenv("OPENWEATHER_API_BASE", "https://api.openweathermap.org").rstrip("/")
+
+WEATHER_URL = f"{API_BASE}/data/2.5/weather"
+FORECAST_URL = f"{API_BASE}/data/2.5/forecast"
+REVERSE_URL = f"{API_BASE}/geo/1.0/reverse"
+ZIP_URL = f"{API_BASE}/geo/1.0/zip"
+
+# (connect, read) timeouts in seconds; the forecast payload is ~40x larger than current weather
+CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "3.05"))
+TIMEOUTS = {
+    'weather': (CONNECT_TIMEOUT, float(os.getenv("WEATHER_READ_TIMEOUT", "5"))),
+    'forecast': (CONNECT_TIMEOUT, float(os.getenv("FORECAST_READ_TIMEOUT", "8"))),
+    'geo': (CONNECT_TIMEOUT, float(os.getenv("GEO_READ_TIMEOUT", "5"))),
+}
+
+MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+RETRY_BACKOFF = float(os.getenv("UPSTREAM_RETRY_BACKOFF", "0.2"))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+POOL_SIZE = int(os.getenv("UPSTREAM_POOL_SIZE", "32"))
+
+# Send a duplicate of a call that is slower than the endpoint's recent p95 and take whichever answers first
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "0").lower() in ("1", "true", "yes")
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", "0.05"))
+
+# status is the HTTP status code, or the exception name for timeouts and connection errors
+UPSTREAM_SECONDS = Histogram('weather_upstream_request_duration_seconds',
+                             'Latency of individual OpenWeather calls', ['endpoint', 'status'])
+UPSTREAM_ERRORS = Counter('weather_upstream_errors_total',
+                          'OpenWeather calls that failed or returned a non-200 status', ['endpoint', 'status'])
+
+STALE_SERVED = Counter('weather_cache_stale_served_total',
+                       'Expired cache entries served while a background refresh runs', ['endpoint'])
+LAST_GOOD_SERVED = Counter('weather_last_good_served_total',
+                           'Last known good payloads served because the upstream failed or its breaker was open',
+                           ['endpoint'])
+HEDGES = Counter('weather_upstream_hedges_total', 'Duplicate upstream calls sent by request hedging',
+                 ['endpoint', 'winner'])
+
+breakers = {endpoint: CircuitBreaker(endpoint) for endpoint in TIMEOUTS}
+latencies = {endpoint: LatencyWindow() for endpoint in TIMEOUTS}
+
+# Identical concurrent lookups in a worker share one upstream call. Across workers the lock only
+# helps if a worker that waited can read what the lock holder fetched, i.e. with the shared SQLite tier
+SINGLEFLIGHT_LOCK_DIR = os.getenv("SINGLEFLIGHT_LOCK_DIR")
+if SINGLEFLIGHT_LOCK_DIR and not PERSISTENT_CACHE:
+    print("SINGLEFLIGHT_LOCK_DIR is ignored without PERSISTENT_CACHE=1")
+    SINGLEFLIGHT_LOCK_DIR = None
+inflight = SingleFlight(SINGLEFLIGHT_LOCK_DIR)
+
+# Stale-while-revalidate refreshes run here, off the request path
+refresh_pool = ThreadPoolExecutor(max_workers=int(os.getenv("REFRESH_WORKERS", "4")))
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+# One keep-alive session per process, shared by every thread
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+session.mount("https://", _adapter)
+session.mount("http://", _adapter)
+
+# Hedged calls run both attempts here so the caller can stop waiting on the slow one
+hedge_pool = ThreadPoolExecutor(max_workers=POOL_SIZE * 2)
+
+
+def _retry_after(response):
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _hedge_delay(endpoint):
+    """Seconds to wait before hedging a call, None when hedging is off or there's no p95 yet"""
+    if not HEDGE_REQUESTS:
+        return None
+    p95 = latencies[endpoint].p95()
+    return None if p95 is None else max(p95, HEDGE_MIN_DELAY)
+
+
+def _send(url, params, endpoint):
+    delay = _hedge_delay(endpoint)
+    if delay is None:
+        return session.get(url, params=params, timeout=TIMEOUTS[endpoint])
+
+    first = hedge_pool.submit(session.get, url, params=params, timeout=TIMEOUTS[endpoint])
+    # Hedges only spend quota that is free right now
+    if wait([first], timeout=delay).done or not limiter.try_acquire():
+        return first.result()
+
+    second = hedge_pool.submit(session.get, url, params=params, timeout=TIMEOUTS[endpoint])
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                HEDGES.inc(endpoint=endpoint, winner='hedge' if future is second else 'first')
+                return future.result()
+    return first.result()
+
+
+def get_json(url, params, endpoint='weather', priority=INTERACTIVE):
+    """GET an OpenWeather endpoint and return (status_code, payload).
+
+    Every attempt first passes the endpoint's circuit breaker (raising
+    resilience.CircuitOpen while it is open) and takes a token from the rate
+    limiter at the given priority (raising ratelimit.RateLimited if none
+    comes in time). Transient 5xx responses, 429s and dropped connections are
+    retried up to MAX_RETRIES times with exponential backoff and full jitter.
+    """
+    params = dict(params, appid=API_KEY)
+    breaker = breakers[endpoint]
+
+    for attempt in range(MAX_RETRIES + 1):
+        breaker.check()
+        try:
+            limiter.acquire(priority)
+        except RateLimited:
+            breaker.abandon()
+            raise
+        start = time.perf_counter()
+        status, elapsed = 'error', None
+        try:
+            response = _send(url, params, endpoint)
+            elapsed = time.perf_counter() - start
+            status = response.status_code
+        except requests.RequestException as e:
+            elapsed = time.perf_counter() - start
+            status = type(e).__name__
+            breaker.failed()
+            UPSTREAM_ERRORS.inc(endpoint=endpoint, status=status)
+            if not isinstance(e, requests.ConnectionError) or attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status_code >= 500:
+                breaker.failed()
+            else:
+                breaker.succeeded()
+                latencies[endpoint].observe(elapsed)
+            if response.status_code == 429:
+                # The limiter pauses everyone, so the retry below waits for that pause
+                limiter.throttled(_retry_after(response))
+            else:
+                limiter.succeeded()
+            if response.status_code != 200:
+                UPSTREAM_ERRORS.inc(endpoint=endpoint, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response.status_code, response.json()
+        finally:
+            # Timeouts and connection errors are observed too, so slow failures show up in the latency
+            if elapsed is None:
+                elapsed = time.perf_counter() - start
+            UPSTREAM_SECONDS.observe(elapsed, endpoint=endpoint, status=status)
+
+        time.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** attempt))
+
+
+def _fetch_and_cache(cache, url, params, endpoint, key, priority):
+    status_code, payload = get_json(url, params, endpoint, priority)
+    # Only successful responses are cached so a typo'd city is retried next time
+    if status_code == 200:
+        cache.set(key, payload)
+    return status_code, payload
+
+
+def _cached(cache, url, params, endpoint, priority):
+    key = location_key(params)
+    prefetcher.record((endpoint,) + key, (endpoint, params))
+
+    payload, stale = cache.lookup(key)
+    if payload is not None:
+        if stale:
+            STALE_SERVED.inc(endpoint=endpoint)
+            _revalidate(endpoint, params)
+        return 200, payload
+
+    def recheck():
+        payload = cache.get(key)
+        return None if payload is None else (200, payload)
+
+    try:
+        status_code, payload = inflight.do((endpoint,) + key,
+                                           lambda: _fetch_and_cache(cache, url, params, endpoint, key, priority),
+                                           recheck)
+    except (CircuitOpen, requests.RequestException):
+        fallback = _last_good(cache, key, endpoint)
+        if fallback is None:
+            raise
+        return fallback
+    if status_code >= 500:
+        return _last_good(cache, key, endpoint) or (status_code, payload)
+    return status_code, payload
+
+
+def _last_good(cache, key, endpoint):
+    """(200, payload marked stale) from the last successful call for key, None if there isn't one"""
+    payload = cache.last_known(key)
+    if payload is None:
+        return None
+    LAST_GOOD_SERVED.inc(endpoint=endpoint)
+    return 200, dict(payload, stale=True)
+
+
+def refresh(endpoint, params, priority=BACKGROUND):
+    """Fetch params from the upstream into the cache even if it holds a fresh copy, returns the status code"""
+    cache, url = ENDPOINTS[endpoint]
+    key = location_key(params)
+    before = cache.remaining(key)
+
+    def recheck():
+        # Another worker refreshed it in the shared tier while this one waited on the lock
+        # Foreground requests can join this flight, so hand back the payload, not just the status
+        payload = cache.reload(key)
+        after = cache.remaining(key)
+        if payload is not None and after is not None and (before is None or after > before + 1):
+            return 200, payload
+        return None
+
+    status_code, _ = inflight.do((endpoint,) + key,
+                                 lambda: _fetch_and_cache(cache, url, params, endpoint, key, priority),
+                                 recheck)
+    return status_code
+
+
+def remaining(endpoint, params):
+    """Seconds until the cached entry for params expires, None if it isn't cached"""
+    cache, _ = ENDPOINTS[endpoint]
+    return cache.remaining(location_key(params))
+
+
+def freshness(params, endpoints=('weather', 'forecast')):
+    """Whole seconds the cached payloads for params stay fresh, 0 if any is stale or missing"""
+    params, _ = snap_params(params)
+    left = [remaining(endpoint, params) for endpoint in endpoints]
+    return 0 if None in left else max(0, int(min(left)))
+
+
+def _revalidate(endpoint, params):
+    """Refresh a stale entry in the background, at most once at a time per location"""
+    flight_key = (endpoint,) + location_key(params)
+    with _refreshing_lock:
+        if flight_key in _refreshing:
+            return
+        _refreshing.add(flight_key)
+
+    def run():
+        try:
+            refresh(endpoint, params)
+        except (RateLimited, CircuitOpen):
+            pass  # keep serving the stale copy; a later request retries
+        except Exception as e:
+            print(f"Background refresh failed: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(flight_key)
+
+    refresh_pool.submit(run)
+
+
+def _remember_city(cache, cell, params, payload):
+    """Map the grid cell to the city OpenWeather answered with.
+
+    Later lookups in the cell are keyed by that city id, so the payload is
+    cached under the id as well and the next lookup hits.
+    """
+    city_id = remember_city(cell, payload)
+    if city_id and 'id' not in params and not payload.get('stale'):
+        snapped = {k: v for k, v in params.items() if k not in ('lat', 'lon')}
+        cache.set(location_key(dict(snapped, id=city_id)), payload)
+
+
+def get_current(params, priority=INTERACTIVE):
+    """Current conditions for the location in params (q, zip or lat/lon plus units)"""
+    params, cell = snap_params(params)
+    status_code, payload = _cached(current_cache, WEATHER_URL, params, 'weather', priority)
+    if status_code == 200:
+        _remember_city(current_cache, cell, params, payload)
+    return status_code, payload
+
+
+def get_forecast(params, priority=INTERACTIVE):
+    """5 day / 3 hour forecast for the location in params (q, zip or lat/lon plus units)"""
+    params, cell = snap_params(params)
+    status_code, payload = _cached(forecast_cache, FORECAST_URL, params, 'forecast', priority)
+    if status_code == 200:
+        _remember_city(forecast_cache, cell, params, payload)
+    return status_code, payload
+
+
+def geocode(params, priority=INTERACTIVE):
+    """Resolve the location in params (q, zip or lat/lon) to (status_code, place).
+
+    place is the geocodes row: id, name, country, lat and lon. Known queries
+    are answered from the table without an upstream call. New cities are
+    resolved through current weather, ZIP codes through the ZIP geocoding
+    API and coordinates through reverse geocoding, where the coordinates
+    given are kept and only the name is looked up. On failure place is the
+    upstream error payload.
+    """
+    kind, query, _ = location_key(params)
+    place = database.get_geocode(kind, query)
+    if place is not None:
+        return 200, place
+
+    if kind == 'zip':
+        status_code, payload = get_json(ZIP_URL, {'zip': params['zip']}, 'geo', priority)
+        if status_code != 200:
+            return status_code, payload
+        name, country, lat, lon = payload['name'], payload.get('country'), payload['lat'], payload['lon']
+    elif kind == 'latlon':
+        lat, lon = float(params['lat']), float(params['lon'])
+        status_code, payload = get_json(REVERSE_URL, {'lat': lat, 'lon': lon, 'limit': 1}, 'geo', priority)
+        if status_code != 200:
+            return status_code, payload
+        # Open sea has no named place; keep the coordinates as the name
+        nearest = payload[0] if payload else {'name': query}
+        name, country = nearest['name'], nearest.get('country')
+    else:
+        status_code, payload = get_current(params, priority)
+        if status_code != 200:
+            return status_code, payload
+        name, country = payload['name'], payload['sys'].get('country')
+        lat, lon = payload['coord']['lat'], payload['coord']['lon']
+
+    geocode_id = database.save_geocode(kind, query, name, country, lat, lon)
+    return 200, {'id': geocode_id, 'name': name, 'country': country, 'lat': lat, 'lon': lon}
+
+
+ENDPOINTS = {
+    'weather': (current_cache, WEATHER_URL),
+    'forecast': (forecast_cache, FORECAST_URL),
+}
+
+# Keeps the most requested locations fresh; the web apps start it, the CLI doesn't
+prefetcher = PrefetchScheduler(refresh, remaining)
+
+
+# Async variants used by the ASGI app; they share the caches, geohash index and metrics above
+
+_async_client = None
+_async_inflight = {}
+
+
+def async_client():
+    """The process-wide httpx.AsyncClient, created on first use inside the event loop"""
+    global _async_client
+    if _async_client is None:
+        limits = httpx.Limits(max_connections=POOL_SIZE * 8, max_keepalive_connections=POOL_SIZE)
+        _async_client = httpx.AsyncClient(limits=limits)
+    return _async_client
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+async def _send_async(url, params, endpoint, timeout):
+    client = async_client()
+    delay = _hedge_delay(endpoint)
+    if delay is None:
+        return await client.get(url, params=params, timeout=timeout)
+
+    first = asyncio.ensure_future(client.get(url, params=params, timeout=timeout))
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done or not limiter.try_acquire():
+        return await first
+
+    second = asyncio.ensure_future(client.get(url, params=params, timeout=timeout))
+    pending = {first, second}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    HEDGES.inc(endpoint=endpoint, winner='hedge' if task is second else 'first')
+                    return task.result()
+        return first.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def get_json_async(url, params, endpoint='weather', priority=INTERACTIVE):
+    """Async get_json: same breaker, rate limiting, hedging, retries and metrics, without holding a thread"""
+    params = dict(params, appid=API_KEY)
+    connect_timeout, read_timeout = TIMEOUTS[endpoint]
+    timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+    breaker = breakers[endpoint]
+
+    for attempt in range(MAX_RETRIES + 1):
+        breaker.check()
+        try:
+            await limiter.acquire_async(priority)
+        except (RateLimited, asyncio.CancelledError):
+            breaker.abandon()
+            raise
+        start = time.perf_counter()
+        status, elapsed = 'error', None
+        try:
+            response = await _send_async(url, params, endpoint, timeout)
+            elapsed = time.perf_counter() - start
+            status = response.status_code
+        except httpx.HTTPError as e:
+            elapsed = time.perf_counter() - start
+            status = type(e).__name__
+            breaker.failed()
+            UPSTREAM_ERRORS.inc(endpoint=endpoint, status=status)
+            if not isinstance(e, (httpx.ConnectError, httpx.RemoteProtocolError)) or attempt == MAX_RETRIES:
+                raise
+        else:
+            if response.status_code >= 500:
+                breaker.failed()
+            else:
+                breaker.succeeded()
+                latencies[endpoint].observe(elapsed)
+            if response.status_code == 429:
+                limiter.throttled(_retry_after(response))
+            else:
+                limiter.succeeded()
+            if response.status_code != 200:
+                UPSTREAM_ERRORS.inc(endpoint=endpoint, status=response.status_code)
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                return response.status_code, response.json()
+        finally:
+            # Timeouts and connection errors are observed too, so slow failures show up in the latency
+            if elapsed is None:
+                elapsed = time.perf_counter() - start
+            UPSTREAM_SECONDS.observe(elapsed, endpoint=endpoint, status=status)
+
+        await asyncio.sleep(random.uniform(0, RETRY_BACKOFF * 2 ** attempt))
+
+
+async def _cached_async(cache, url, params, endpoint, priority):
+    key = location_key(params)
+    prefetcher.record((endpoint,) + key, (endpoint, params))
+
+    payload, stale = cache.lookup(key)
+    if payload is not None:
+        if stale:
+            STALE_SERVED.inc(endpoint=endpoint)
+            _revalidate(endpoint, params)
+        return 200, payload
+
+    async def fetch():
+        status_code, payload = await get_json_async(url, params, endpoint, priority)
+        if status_code == 200:
+            cache.set(key, payload)
+        return status_code, payload
+
+    # Concurrent callers for the same key await one shared task; shield keeps
+    # a cancelled caller from cancelling the fetch for everyone else
+    flight_key = (endpoint,) + key
+    task = _async_inflight.get(flight_key)
+    if task is None:
+        task = _async_inflight[flight_key] = asyncio.ensure_future(fetch())
+        task.add_done_callback(lambda _: _async_inflight.pop(flight_key, None))
+
+    try:
+        status_code, payload = await asyncio.shield(task)
+    except (CircuitOpen, httpx.HTTPError):
+        fallback = _last_good(cache, key, endpoint)
+        if fallback is None:
+            raise
+        return fallback
+    if status_code >= 500:
+        return _last_good(cache, key, endpoint) or (status_code, payload)
+    return status_code, payload
+
+
+async def get_current_async(params, priority=INTERACTIVE):
+    params, cell = snap_params(params)
+    status_code, payload = await _cached_async(current_cache, WEATHER_URL, params, 'weather', priority)
+    if status_code == 200:
+        _remember_city(current_cache, cell, params, payload)
+    return status_code, payload
+
+
+async def get_forecast_async(params, priority=INTERACTIVE):
+    params, cell = snap_params(params)
+    status_code, payload = await _cached_async(forecast_cache, FORECAST_URL, params, 'forecast', priority)
+    if status_code == 200:
+        _remember_city(forecast_cache, cell, params, payload)
+    return status_code, payload